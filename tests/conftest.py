@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,13 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def yatube_test_environment():
+    """Те же настройки, что у `manage.py test`: строгие бюджеты
+    SQL-запросов, свой кеш и каталог метрик."""
+    from core.test_runner import test_environment
+
+    with test_environment():
+        yield
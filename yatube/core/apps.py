@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def clear_cache(sender, **kwargs):
+    """Кеш живёт в файле и переживает перезапуск, поэтому после миграций
+    (в том числе создания тестовой базы) его содержимое устаревает."""
+    from django.core.cache import cache
+    cache.clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import sqlite
+
+        post_migrate.connect(clear_cache, sender=self)
+        connection_created.connect(sqlite.configure_connection)
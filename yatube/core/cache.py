@@ -0,0 +1,275 @@
+"""Кеш в файле SQLite (WAL), общий для всех процессов на сервере.
+
+Каждый воркер открывает один и тот же файл, поэтому сброс поколения ленты
+в одном процессе сразу виден остальным, а прогретый кеш переживает
+перезапуск воркеров. Внешний сервис (memcached, Redis) не нужен.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/lib/yatube/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+При переполнении вытесняются давно не читавшиеся записи (LRU). Время
+последнего чтения обновляется не чаще раза в `LRU_RESOLUTION` секунд,
+чтобы чтение почти никогда не превращалось в запись.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+FRAGMENT_PREFIX = "template.cache."
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache ("
+    " key TEXT PRIMARY KEY,"
+    " value BLOB NOT NULL,"
+    " expires REAL,"
+    " accessed REAL NOT NULL"
+    ") WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)",
+)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._busy_timeout = options.get("BUSY_TIMEOUT", 5)
+        self._lru_resolution = options.get("LRU_RESOLUTION", 60)
+        self._cull_interval = options.get("CULL_INTERVAL", 16)
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение не переживает fork: у дочернего процесса своё.
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+            local.writes = 0
+        return local.connection
+
+    def _write(self, statements):
+        """Выполняет запросы в одной транзакции с блокировкой на запись."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _encode(value):
+        # Целые числа храним как есть, чтобы incr не распаковывал pickle.
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _store(self, connection, key, value, timeout, replace):
+        now = time.time()
+        verb = "REPLACE" if replace else "IGNORE"
+        if not replace:
+            connection.execute(
+                "DELETE FROM cache WHERE key = ? AND expires <= ?",
+                (key, now),
+            )
+        cursor = connection.execute(
+            f"INSERT OR {verb} INTO cache (key, value, expires, accessed)"
+            " VALUES (?, ?, ?, ?)",
+            (key, self._encode(value), self.get_backend_timeout(timeout), now),
+        )
+        return cursor.rowcount > 0
+
+    def _maybe_cull(self):
+        local = self._local
+        local.writes += 1
+        if local.writes % self._cull_interval:
+            return
+
+        def cull(connection):
+            now = time.time()
+            connection.execute(
+                "DELETE FROM cache WHERE expires <= ?", (now,))
+            count = connection.execute(
+                "SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                connection.execute("DELETE FROM cache")
+            else:
+                excess = count - self._max_entries
+                extra = self._max_entries // self._cull_frequency
+                connection.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    " SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                    (excess + extra,),
+                )
+        self._write(cull)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        added = self._write(
+            lambda connection: self._store(
+                connection, key, value, timeout, replace=False))
+        self._maybe_cull()
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(
+            lambda connection: self._store(
+                connection, key, value, timeout, replace=True))
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = {}
+        for key, value in data.items():
+            full_key = self.make_key(key, version=version)
+            self.validate_key(full_key)
+            keys[full_key] = value
+
+        def store_all(connection):
+            for key, value in keys.items():
+                self._store(connection, key, value, timeout, replace=True)
+        self._write(store_all)
+        self._maybe_cull()
+        return []
+
+    def _fetch(self, keys):
+        """Живые значения по полным ключам с отметкой о чтении для LRU."""
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ", ".join("?" * len(keys))
+        rows = self._connection().execute(
+            "SELECT key, value, accessed FROM cache"
+            f" WHERE key IN ({placeholders})"
+            " AND (expires IS NULL OR expires > ?)",
+            (*keys, now),
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed > self._lru_resolution]
+        if stale:
+            placeholders = ", ".join("?" * len(stale))
+            self._write(lambda connection: connection.execute(
+                f"UPDATE cache SET accessed = ? WHERE key IN ({placeholders})",
+                (now, *stale),
+            ))
+        return {key: self._decode(value) for key, value, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        full_key = self.make_key(key, version=version)
+        self.validate_key(full_key)
+        values = self._fetch([full_key])
+        if key.startswith(FRAGMENT_PREFIX):
+            # Ключ тега {% cache %}: template.cache.<имя фрагмента>.<хеш>
+            metrics.inc(
+                "yatube_cache_requests_total",
+                fragment=key[len(FRAGMENT_PREFIX):].split(".", 1)[0],
+                result="hit" if full_key in values else "miss",
+            )
+        return values.get(full_key, default)
+
+    def get_many(self, keys, version=None):
+        full_keys = {}
+        for key in keys:
+            full_key = self.make_key(key, version=version)
+            self.validate_key(full_key)
+            full_keys[full_key] = key
+        values = self._fetch(list(full_keys))
+        return {full_keys[key]: value for key, value in values.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection().execute(
+            "SELECT 1 FROM cache WHERE key = ?"
+            " AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        def increment(connection):
+            row = connection.execute(
+                "SELECT value FROM cache WHERE key = ?"
+                " AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._decode(row[0]) + delta
+            connection.execute(
+                "UPDATE cache SET value = ? WHERE key = ?",
+                (self._encode(value), key),
+            )
+            return value
+        return self._write(increment)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._write(lambda connection: connection.execute(
+            "UPDATE cache SET expires = ? WHERE key = ?"
+            " AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ))
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(lambda connection: connection.execute(
+            "DELETE FROM cache WHERE key = ?", (key,)))
+
+    def delete_many(self, keys, version=None):
+        full_keys = []
+        for key in keys:
+            full_key = self.make_key(key, version=version)
+            self.validate_key(full_key)
+            full_keys.append(full_key)
+        if not full_keys:
+            return
+        placeholders = ", ".join("?" * len(full_keys))
+        self._write(lambda connection: connection.execute(
+            f"DELETE FROM cache WHERE key IN ({placeholders})", full_keys))
+
+    def clear(self):
+        self._write(lambda connection: connection.execute(
+            "DELETE FROM cache"))
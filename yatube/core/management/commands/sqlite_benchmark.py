@@ -0,0 +1,156 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sqlite import apply_pragmas, copy_database, is_locked
+
+# Настройки SQLite по умолчанию, как до core.sqlite.
+BASELINE_PRAGMAS = {"journal_mode": "delete", "synchronous": "full"}
+
+READ_SQL = (
+    "SELECT id, text, author_id, group_id, pub_date FROM posts_post"
+    " ORDER BY pub_date DESC, id DESC LIMIT 10 OFFSET ?"
+)
+WRITE_SQL = (
+    "INSERT INTO posts_comment (post_id, author_id, text, pub_date)"
+    " VALUES (?, ?, ?, datetime('now'))"
+)
+COUNTER_SQL = (
+    "UPDATE posts_post SET comments_count = comments_count + 1"
+    " WHERE id = ?"
+)
+
+
+def _worker(path, pragmas, kind, duration, ids, seed, results):
+    """Читает ленту или пишет комментарии, пока не выйдет время."""
+    rng = random.Random(seed)
+    post_ids, user_ids = ids
+    db = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(db, pragmas)
+    done = locked = 0
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if kind == "read":
+                db.execute(READ_SQL, (rng.randrange(1000),)).fetchall()
+            else:
+                post_id = rng.choice(post_ids)
+                db.execute("BEGIN")
+                db.execute(
+                    WRITE_SQL, (post_id, rng.choice(user_ids), "Бенчмарк"))
+                db.execute(COUNTER_SQL, (post_id,))
+                db.execute("COMMIT")
+        except sqlite3.OperationalError as error:
+            if not is_locked(error):
+                raise
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        done += 1
+    db.close()
+    results.put((kind, done, locked, latencies))
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность SQLite с настройками по "
+        "умолчанию и с SQLITE_PRAGMAS при параллельных читателях и "
+        "писателях. Работает на копии основной базы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument(
+            "--duration", type=float, default=5.0,
+            help="Секунд на каждый режим.",
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "bench.sqlite3")
+            copy_database(path)
+            ids = self._ids(path)
+            for mode, pragmas in (
+                ("по умолчанию", BASELINE_PRAGMAS),
+                ("SQLITE_PRAGMAS", settings.SQLITE_PRAGMAS),
+            ):
+                self._report(mode, self._run(path, pragmas, ids, options))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _ids(self, path):
+        db = sqlite3.connect(path)
+        try:
+            post_ids = [row[0] for row in db.execute(
+                "SELECT id FROM posts_post ORDER BY random() LIMIT 1000")]
+            user_ids = [row[0] for row in db.execute(
+                "SELECT id FROM auth_user ORDER BY random() LIMIT 1000")]
+        finally:
+            db.close()
+        if not post_ids or not user_ids:
+            raise CommandError(
+                "В базе нет постов: сначала выполните seed_benchmark.")
+        return post_ids, user_ids
+
+    def _run(self, path, pragmas, ids, options):
+        # journal_mode хранится в самом файле, поэтому переключаем его
+        # заранее, без конкурентов.
+        db = sqlite3.connect(path)
+        apply_pragmas(db, {"journal_mode": pragmas["journal_mode"]})
+        db.close()
+        context = get_context("spawn")
+        results = context.Queue()
+        kinds = (["read"] * options["readers"]
+                 + ["write"] * options["writers"])
+        workers = [
+            context.Process(target=_worker, args=(
+                path, pragmas, kind, options["duration"], ids, seed,
+                results,
+            ))
+            for seed, kind in enumerate(kinds)
+        ]
+        for worker in workers:
+            worker.start()
+        totals = {
+            kind: {"done": 0, "locked": 0, "latencies": []}
+            for kind in ("read", "write")
+        }
+        for _ in workers:
+            kind, done, locked, latencies = results.get()
+            totals[kind]["done"] += done
+            totals[kind]["locked"] += locked
+            totals[kind]["latencies"] += latencies
+        for worker in workers:
+            worker.join()
+        for total in totals.values():
+            total["per_second"] = total["done"] / options["duration"]
+        return totals
+
+    def _report(self, mode, totals):
+        self.stdout.write(mode)
+        for kind, total in totals.items():
+            p99 = _percentile(total["latencies"], 0.99) * 1000
+            self.stdout.write(
+                f"  {kind}: {total['per_second']:.0f}/с, "
+                f"p99 {p99:.1f} мс, database is locked: {total['locked']}"
+            )
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.sqlite import copy_database
+from posts import caching
+
+
+class Command(BaseCommand):
+    help = "Копирует основную базу в файлы реплик из DATABASE_REPLICAS."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--to",
+            action="append",
+            default=[],
+            metavar="PATH",
+            help="Скопировать ещё и в этот файл (можно несколько раз).",
+        )
+
+    def handle(self, *args, **options):
+        targets = [
+            (alias, connections[alias].settings_dict["NAME"])
+            for alias in settings.DATABASE_REPLICAS
+        ] + [(None, path) for path in options["to"]]
+        if not targets:
+            raise CommandError(
+                "Реплик нет: задайте YATUBE_REPLICA_DBS или --to.")
+        for alias, target in targets:
+            try:
+                copy_database(target)
+            except ValueError as error:
+                raise CommandError(error)
+            if alias is not None:
+                # Страницы, закешированные с прежнего снимка, устарели.
+                caching.bump(caching.replica_feed(alias))
+            self.stdout.write(f"{target}: скопировано")
+        self.stdout.write(self.style.SUCCESS("Реплики обновлены."))
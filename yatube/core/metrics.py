@@ -0,0 +1,259 @@
+"""Метрики в текстовом формате Prometheus, общие для всех процессов.
+
+Каждый процесс копит счётчики и гистограммы в памяти и не чаще раза
+в `METRICS_FLUSH_INTERVAL` секунд сбрасывает их в свой файл
+`METRICS_DIR/<pid>.json`. Страница `/metrics` складывает файлы всех
+процессов, поэтому запись метрики стоит одного обновления словаря.
+
+    metrics.inc("yatube_cache_requests_total", fragment="index_page",
+                result="hit")
+    with metrics.timer("yatube_thumbnail_seconds"):
+        ...
+
+Файлы завершившихся процессов при чтении метрик складываются в общий
+файл `ARCHIVE` и удаляются: суммы счётчиков не уменьшаются, а файлов
+не больше, чем живых процессов. Поэтому каталог у каждой машины свой —
+pid из чужого пространства имён сочли бы завершившимся. Если pid
+достанется новому процессу раньше, чем метрики прочитают, его файл
+перезапишется, и Prometheus увидит это как обычный сброс счётчика.
+"""
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Файл, куда складываются метрики завершившихся процессов.
+ARCHIVE = "dead.json"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HELP = {
+    "yatube_request_duration_seconds": "Время ответа представления.",
+    "yatube_requests_total": "Ответы по представлениям и кодам.",
+    "yatube_template_render_seconds": "Время отрисовки шаблона.",
+    "yatube_cache_requests_total": "Чтения кеша фрагментов шаблонов.",
+    "yatube_thumbnail_seconds": "Время создания миниатюры sorl.",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_state = {"flushed": 0.0, "pid": None}
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _check_pid():
+    # После fork дочерний процесс не должен повторно отчитаться
+    # за данные родителя.
+    pid = os.getpid()
+    if _state["pid"] != pid:
+        _counters.clear()
+        _histograms.clear()
+        _state["pid"] = pid
+
+
+def inc(name, amount=1, **labels):
+    """Увеличивает счётчик."""
+    key = (name, _labels(labels))
+    with _lock:
+        _check_pid()
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Добавляет наблюдение в гистограмму (обычно время в секундах)."""
+    key = (name, _labels(labels))
+    with _lock:
+        _check_pid()
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += value
+        histogram[2] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    """Записывает длительность блока в гистограмму `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def _directory():
+    return settings.METRICS_DIR
+
+
+def flush(force=False):
+    """Сбрасывает метрики процесса в его файл (не чаще интервала)."""
+    now = time.monotonic()
+    if not force and now - _state["flushed"] < settings.METRICS_FLUSH_INTERVAL:
+        return
+    with _lock:
+        _check_pid()
+        _state["flushed"] = now
+        data = _serialize(_counters, _histograms)
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    _write(os.path.join(directory, f"{os.getpid()}.json"), data)
+
+
+def _serialize(counters, histograms):
+    return {
+        "counters": [
+            [name, dict(labels), value]
+            for (name, labels), value in counters.items()
+        ],
+        "histograms": [
+            [name, dict(labels), *histogram]
+            for (name, labels), histogram in histograms.items()
+        ],
+    }
+
+
+def _write(path, data):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def reset():
+    """Удаляет накопленные метрики всех процессов (для тестов)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+    for path in glob.glob(os.path.join(_directory(), "*.json")):
+        os.remove(path)
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data["counters"]:
+        key = (name, _labels(labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets, total, count in data["histograms"]:
+        key = (name, _labels(labels))
+        merged = histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _dead_files(directory):
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        name = os.path.basename(path)[:-len(".json")]
+        if name.isdigit() and not _alive(int(name)):
+            yield path
+
+
+def compact():
+    """Складывает файлы завершившихся процессов в `ARCHIVE`."""
+    directory = _directory()
+    dead = list(_dead_files(directory))
+    if not dead:
+        return
+    archive = os.path.join(directory, ARCHIVE)
+    # Под блокировкой: два одновременных чтения не должны сложить
+    # один и тот же файл дважды.
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        counters, histograms = {}, {}
+        for path in [archive, *dead]:
+            try:
+                with open(path) as file:
+                    _merge(counters, histograms, json.load(file))
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                pass
+        _write(archive, _serialize(counters, histograms))
+        for path in dead:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def collect():
+    """Метрики всех процессов, сложенные вместе."""
+    flush(force=True)
+    compact()
+    counters = {}
+    histograms = {}
+    for path in glob.glob(os.path.join(_directory(), "*.json")):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        _merge(counters, histograms, data)
+    return counters, histograms
+
+
+def _escape(value):
+    return (value.replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _format_labels(labels, *extra):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    inner = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return "{" + inner + "}"
+
+
+def _header(lines, name, kind):
+    if name in HELP:
+        lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def render():
+    """Текст для Prometheus (exposition format 0.0.4)."""
+    counters, histograms = collect()
+    lines = []
+    previous = None
+    for (name, labels), value in sorted(counters.items()):
+        if name != previous:
+            _header(lines, name, "counter")
+            previous = name
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (buckets, total, count) in sorted(
+            histograms.items()):
+        if name != previous:
+            _header(lines, name, "histogram")
+            previous = name
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, buckets):
+            cumulative += bucket
+            le = _format_labels(labels, ("le", str(bound)))
+            lines.append(f"{name}_bucket{le} {cumulative}")
+        le = _format_labels(labels, ("le", "+Inf"))
+        lines.append(f"{name}_bucket{le} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,163 @@
+"""Учёт времени и SQL-запросов по представлениям.
+
+`QueryBudgetMiddleware` считает запросы и время в базе для каждого
+запроса к сайту и отдаёт их в заголовке `Server-Timing`. Если у
+представления объявлен бюджет (словарь `query_budgets` рядом с
+`urlpatterns` в urls.py приложения), превышение пишется в лог, а при
+`QUERY_BUDGET_STRICT = True` (так запускаются тесты) — падает с ошибкой.
+
+    # posts/urls.py
+    query_budgets = {
+        "index": 4,
+        "post_detail": 6,
+    }
+"""
+import logging
+import time
+from contextlib import ExitStack
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+
+from . import metrics, profiling, routers
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """Обёртка `execute_wrapper`: число запросов и суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def _collect_budgets(resolver, namespace=""):
+    budgets = {}
+    for pattern in resolver.url_patterns:
+        if not isinstance(pattern, URLResolver):
+            continue
+        prefix = namespace
+        if pattern.namespace:
+            prefix = f"{namespace}{pattern.namespace}:"
+        declared = getattr(pattern.urlconf_module, "query_budgets", {})
+        for name, budget in declared.items():
+            budgets[prefix + name] = budget
+        budgets.update(_collect_budgets(pattern, prefix))
+    return budgets
+
+
+@lru_cache(maxsize=None)
+def query_budgets(urlconf):
+    """Бюджеты всех представлений по полному имени (`posts:index`)."""
+    resolver = get_resolver(urlconf)
+    budgets = dict(getattr(resolver.urlconf_module, "query_budgets", {}))
+    budgets.update(_collect_budgets(resolver))
+    return budgets
+
+
+class MetricsMiddleware:
+    """Время ответа и число ответов по представлениям для /metrics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match is not None else "<unresolved>"
+        metrics.observe("yatube_request_duration_seconds", duration,
+                        view=view)
+        metrics.inc("yatube_requests_total", view=view,
+                    status=response.status_code)
+        metrics.flush()
+        return response
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        response["Server-Timing"] = (
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries"'
+        )
+        match = request.resolver_match
+        if match is not None:
+            urlconf = getattr(request, "urlconf", settings.ROOT_URLCONF)
+            budget = query_budgets(urlconf).get(match.view_name)
+            if budget is not None and recorder.count > budget:
+                self.over_budget(match.view_name, recorder.count, budget)
+        return response
+
+    def over_budget(self, view_name, count, budget):
+        message = (
+            f"{view_name}: {count} SQL-запросов при бюджете {budget}")
+        if getattr(settings, "QUERY_BUDGET_STRICT", False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос по флагу сотрудника или токену (см. profiling).
+
+    Стоит после AuthenticationMiddleware: флаг в адресе проверяется
+    по `request.user`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if profiling.requested(request):
+            return profiling.profile(request, self.get_response)
+        return self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """GET и HEAD читают с реплики, если клиент недавно ничего не
+    записывал (см. core.routers)."""
+
+    cookie_name = "primary_reads"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replicas = (
+            request.method in ("GET", "HEAD")
+            and self.cookie_name not in request.COOKIES
+        )
+        with routers.routing(use_replicas) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            response.set_cookie(
+                self.cookie_name, "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,181 @@
+"""Профилирование отдельного запроса по требованию.
+
+Запрос профилируется, если сотрудник (`is_staff`) добавил к адресу
+`?_profile=1` или если в заголовке `X-Profile` пришёл подписанный токен
+из `make_token()` — так можно профилировать страницу curl'ом без
+сессии:
+
+    >>> from core import profiling
+    >>> profiling.make_token()  # в manage.py shell
+    $ curl -H "X-Profile: <токен>" https://.../group/cats/
+
+Дамп cProfile и список SQL-запросов сохраняются в `PROFILING_DIR`,
+хранятся последние `PROFILING_KEEP` записей. Имя записи приходит в
+заголовке ответа `X-Profile`, сами записи видны сотрудникам на
+странице /profiles/. Обычные запросы только проверяют, нет ли флага.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+QUERY_FLAG = "_profile"
+HEADER = "HTTP_X_PROFILE"
+SALT = "core.profiling"
+TOKEN_MAX_AGE = 60 * 60
+NAME = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{8}$")
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+def make_token():
+    """Токен для заголовка `X-Profile`, действует `TOKEN_MAX_AGE` секунд."""
+    return signing.TimestampSigner(salt=SALT).sign("profile")
+
+
+def _valid_token(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def requested(request):
+    """Просит ли запрос профилирования и можно ли ему это."""
+    token = request.META.get(HEADER)
+    if token is not None:
+        return _valid_token(token)
+    if QUERY_FLAG in request.GET:
+        return request.user.is_staff
+    return False
+
+
+class SQLRecorder:
+    """Обёртка `execute_wrapper`: текст, параметры и время запросов."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "sql": sql,
+                "params": repr(params),
+                "many": many,
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def profile(request, get_response):
+    """Выполняет запрос под профилировщиком и сохраняет результат."""
+    profiler = cProfile.Profile()
+    recorder = SQLRecorder()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    duration = time.perf_counter() - started
+    match = request.resolver_match
+    meta = {
+        "method": request.method,
+        "path": request.get_full_path(),
+        "view": match.view_name if match is not None else None,
+        "status": response.status_code,
+        "ms": round(duration * 1000, 1),
+        "sql_ms": round(sum(query["ms"] for query in recorder.queries), 1),
+        "created": time.time(),
+        "queries": recorder.queries,
+    }
+    response["X-Profile"] = save(profiler, meta)
+    return response
+
+
+def _directory():
+    return settings.PROFILING_DIR
+
+
+def _path(name, extension):
+    if not NAME.match(name):
+        raise FileNotFoundError(name)
+    return os.path.join(_directory(), f"{name}.{extension}")
+
+
+def save(profiler, meta):
+    """Пишет дамп и описание запроса, удаляет старые записи."""
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(_directory(), exist_ok=True)
+    profiler.dump_stats(_path(name, "prof"))
+    with open(_path(name, "json"), "w") as file:
+        json.dump({"name": name, **meta}, file)
+    rotate()
+    return name
+
+
+def names():
+    """Имена сохранённых записей, новые первыми."""
+    try:
+        files = os.listdir(_directory())
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (file[:-5] for file in files
+         if file.endswith(".json") and NAME.match(file[:-5])),
+        reverse=True,
+    )
+
+
+def rotate():
+    for name in names()[settings.PROFILING_KEEP:]:
+        for extension in ("prof", "json"):
+            try:
+                os.remove(_path(name, extension))
+            except FileNotFoundError:
+                pass
+
+
+def load(name):
+    """Описание запроса со списком SQL. FileNotFoundError, если нет."""
+    with open(_path(name, "json")) as file:
+        return json.load(file)
+
+
+def entries():
+    result = []
+    for name in names():
+        try:
+            meta = load(name)
+        except (OSError, ValueError):
+            continue
+        meta["query_count"] = len(meta.pop("queries"))
+        result.append(meta)
+    return result
+
+
+def dump_path(name):
+    return _path(name, "prof")
+
+
+def report(name, sort="cumulative", limit=60):
+    """Текстовый отчёт pstats по дампу записи."""
+    stream = io.StringIO()
+    stats = pstats.Stats(dump_path(name), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,91 @@
+"""Чтение с реплик для GET-запросов.
+
+Реплики — алиасы из `settings.DATABASE_REPLICAS`; пустой список значит,
+что всё читается и пишется в `default`. `ReplicaMiddleware` разрешает
+читать с реплики на время GET- и HEAD-запросов, остальное идёт в
+основную базу. Каждому запросу достаётся одна случайная реплика, чтобы
+связанные объекты читались из одного снимка.
+
+Пользователь, который что-то записал, получает cookie и следующие
+`REPLICA_STICKY_SECONDS` секунд читает только из основной базы: свой
+пост или комментарий он видит сразу, не дожидаясь реплик. Чтения,
+которым нужны самые свежие данные (есть ли подписка), оборачиваются
+в `primary()`:
+
+    with routers.primary():
+        following = Follow.objects.filter(...).exists()
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = "default"
+# Сессии пишутся при входе и читаются на каждом запросе: с отстающей
+# реплики пользователь только что после входа оказался бы анонимом.
+PRIMARY_ONLY_APPS = {"sessions"}
+
+_state = ContextVar("replica_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+@contextmanager
+def routing(use_replicas):
+    """Состояние маршрутизации на время запроса (см. ReplicaMiddleware)."""
+    replicas = settings.DATABASE_REPLICAS
+    replica = random.choice(replicas) if use_replicas and replicas else None
+    state = RoutingState(replica)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary():
+    """Читает из основной базы внутри блока (или декорированной функции)."""
+    outer = _state.get()
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+        if outer is not None and state.wrote:
+            outer.wrote = True
+
+
+def replica():
+    """Реплика, с которой сейчас читаются данные, или None."""
+    state = _state.get()
+    return state.replica if state is not None else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None:
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики не мигрируют: это копии основной базы.
+        return db not in settings.DATABASE_REPLICAS
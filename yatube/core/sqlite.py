@@ -0,0 +1,88 @@
+"""Настройка SQLite для работы под нагрузкой.
+
+При открытии каждого соединения выполняются PRAGMA из
+`settings.SQLITE_PRAGMAS`: WAL, чтобы читатели не ждали писателя,
+synchronous=NORMAL (в режиме WAL сбой питания может потерять последние
+транзакции, но не испортить базу), увеличенные mmap и кеш страниц и
+ожидание блокировки. Соединения живут `CONN_MAX_AGE` секунд, так что
+PRAGMA выполняются раз на соединение, а не на каждый запрос.
+
+Писатели в SQLite всё равно идут по одному. Если блокировку не удалось
+получить за busy_timeout или транзакция не смогла перейти от чтения
+к записи, SQLite отвечает `database is locked`; представления с
+`@retry_on_locked` в этом случае повторяются с нарастающей паузой.
+"""
+import functools
+import random
+import sqlite3
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+
+
+def is_locked(error):
+    return "database is locked" in str(error)
+
+
+def retry_on_locked(view=None, attempts=5, delay=0.05):
+    """Повторяет представление, если база занята другим писателем.
+
+    Пауза удваивается с каждой попыткой и немного случайна, чтобы
+    одновременно отвергнутые запросы не столкнулись снова. Загруженные
+    файлы перематываются в начало: форма прочитает их заново.
+    """
+    if view is None:
+        return functools.partial(
+            retry_on_locked, attempts=attempts, delay=delay)
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        for attempt in range(attempts):
+            try:
+                return view(request, *args, **kwargs)
+            except OperationalError as error:
+                last = attempt == attempts - 1
+                # Внутри чужой транзакции повтор ничего не исправит.
+                if last or not is_locked(error) or _in_atomic_block():
+                    raise
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+            for upload in request.FILES.values():
+                upload.seek(0)
+
+    return wrapper
+
+
+def _in_atomic_block():
+    return transaction.get_connection().in_atomic_block
+
+
+def copy_database(target, using="default"):
+    """Копирует базу SQLite в файл `target` через backup API.
+
+    Копия пишется на место прежней под блокировкой SQLite, поэтому
+    читатели копии видят либо старый снимок, либо новый целиком.
+    Ждёт окончания открытых транзакций основной базы.
+    """
+    source = connections[using]
+    if source.vendor != "sqlite":
+        raise ValueError("Копировать можно только базу SQLite.")
+    source.ensure_connection()
+    destination = sqlite3.connect(target)
+    try:
+        source.connection.backup(destination)
+    finally:
+        destination.close()
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def test_environment():
+    """Настройки на время тестов: превышение бюджета SQL-запросов —
+    ошибка, а не запись в логе, а метрики и файл кеша лежат во
+    временном каталоге, так что тесты не трогают кеш сайта и не мешают
+    друг другу при параллельных запусках.
+
+    Используется и `manage.py test`, и pytest (tests/conftest.py).
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        with override_settings(
+            QUERY_BUDGET_STRICT=True,
+            METRICS_DIR=os.path.join(directory, "metrics"),
+            CACHES={
+                "default": dict(
+                    settings.CACHES["default"],
+                    LOCATION=os.path.join(directory, "cache.sqlite3"),
+                ),
+            },
+        ):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = test_environment()
+        self.test_settings.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,444 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+from io import StringIO
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.urls import path, reverse
+
+from . import metrics, profiling, routers
+from .cache import SQLiteCache
+from .middleware import QueryBudgetExceeded
+from .sqlite import retry_on_locked
+
+
+def _incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr("counter")
+
+
+def three_queries(request):
+    for _ in range(3):
+        get_user_model().objects.exists()
+    return HttpResponse()
+
+
+def read_database(request):
+    users = get_user_model().objects.all()
+    return HttpResponse(f"{users.db} {users.count()}")
+
+
+def write_database(request):
+    get_user_model().objects.filter(pk=0).update(is_staff=False)
+    return HttpResponse()
+
+
+urlpatterns = [
+    path("three/", three_queries, name="three"),
+    path("unlimited/", three_queries, name="unlimited"),
+    path("db/", read_database, name="db"),
+    path("write/", write_database, name="write"),
+]
+query_budgets = {"three": 2}
+
+
+def _count_in_process(directory):
+    with override_settings(METRICS_DIR=directory):
+        metrics.inc("test_total", view="a")
+        metrics.observe("test_seconds", 0.2)
+        metrics.flush(force=True)
+
+
+class TestEnvironmentTest(SimpleTestCase):
+    def test_cache_is_not_the_site_cache(self):
+        site_cache = os.path.join(settings.BASE_DIR, "cache")
+        self.assertFalse(cache._path.startswith(site_cache))
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, "cache.sqlite3")
+        self.cache = SQLiteCache(
+            self.location,
+            {"OPTIONS": {
+                "MAX_ENTRIES": 10,
+                "CULL_INTERVAL": 1,
+                "LRU_RESOLUTION": 0,
+            }},
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_set_add_delete(self):
+        self.cache.set("key", {"value": [1, 2]})
+        self.assertEqual(self.cache.get("key"), {"value": [1, 2]})
+        self.assertFalse(self.cache.add("key", "другое"))
+        self.assertTrue(self.cache.add("new", None))
+        self.assertIsNone(self.cache.get("new", "default"))
+        self.cache.delete("key")
+        self.assertEqual(self.cache.get("key", "default"), "default")
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set("key", "value", timeout=-1)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertTrue(self.cache.add("key", "value"))
+
+    def test_incr_is_shared_between_processes(self):
+        self.cache.set("counter", 0)
+        context = get_context("spawn")
+        workers = [
+            context.Process(target=_incr_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get("counter"), 200)
+
+    def test_incr_missing_key(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        self.cache.set("hot", "value")
+        for i in range(20):
+            self.cache.set(f"key{i}", i)
+            self.assertEqual(self.cache.get("hot"), "value")
+        count = self.cache._connection().execute(
+            "SELECT COUNT(*) FROM cache").fetchone()[0]
+        self.assertLessEqual(count, 10)
+        self.assertIsNone(self.cache.get("key0"))
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class QueryBudgetMiddlewareTest(TestCase):
+    def test_server_timing(self):
+        response = self.client.get("/unlimited/")
+        self.assertRegex(
+            response["Server-Timing"], r'^db;dur=[\d.]+;desc="3 queries"$')
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_fails(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "three: 3"):
+            self.client.get("/three/")
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_warns_in_production(self):
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            response = self.client.get("/three/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("бюджете 2", logs.output[0])
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        metrics.reset()
+        cache.clear()
+
+    def test_processes_are_summed(self):
+        context = get_context("spawn")
+        workers = [
+            context.Process(target=_count_in_process, args=(self.directory,))
+            for _ in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        metrics.inc("test_total", view="a")
+        text = metrics.render()
+        self.assertIn('test_total{view="a"} 3', text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('test_seconds_bucket{le="0.25"} 2', text)
+        self.assertIn("test_seconds_count 2", text)
+
+    def test_dead_processes_are_archived(self):
+        context = get_context("spawn")
+        worker = context.Process(
+            target=_count_in_process, args=(self.directory,))
+        worker.start()
+        worker.join()
+        self.assertIn(f"{worker.pid}.json", os.listdir(self.directory))
+        for _ in range(2):
+            text = metrics.render()
+            self.assertIn('test_total{view="a"} 1', text)
+        self.assertNotIn(f"{worker.pid}.json", os.listdir(self.directory))
+        self.assertIn(metrics.ARCHIVE, os.listdir(self.directory))
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"])
+    def test_metrics_are_not_public(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 200)
+        staff = get_user_model().objects.create_user(
+            "staff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_views_templates_and_fragments(self):
+        self.client.get(reverse("posts:index"))
+        self.client.get(reverse("posts:index"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{status="200",view="posts:index"} 2', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text)
+        self.assertIn(
+            'yatube_template_render_seconds_count'
+            '{template="posts/index.html"} 2', text)
+        self.assertIn(
+            'yatube_cache_requests_total'
+            '{fragment="index_page",result="hit"} 1', text)
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings_override = override_settings(
+            PROFILING_DIR=self.directory, PROFILING_KEEP=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        User = get_user_model()
+        self.staff = User.objects.create_user("staff", is_staff=True)
+        self.user = User.objects.create_user("user")
+        cache.clear()
+
+    def test_only_staff_can_trigger_with_flag(self):
+        url = reverse("posts:profile", args=["user"]) + "?_profile=1"
+        self.assertNotIn("X-Profile", self.client.get(url))
+        self.client.force_login(self.user)
+        self.assertNotIn("X-Profile", self.client.get(url))
+        self.assertEqual(profiling.names(), [])
+        self.client.force_login(self.staff)
+        name = self.client.get(url)["X-Profile"]
+        self.assertEqual(profiling.names(), [name])
+        entry = profiling.load(name)
+        self.assertEqual(entry["view"], "posts:profile")
+        self.assertTrue(entry["queries"])
+
+    def test_signed_header(self):
+        url = reverse("about:tech")
+        response = self.client.get(url, HTTP_X_PROFILE="подделка")
+        self.assertNotIn("X-Profile", response)
+        response = self.client.get(
+            url, HTTP_X_PROFILE=profiling.make_token())
+        self.assertIn("X-Profile", response)
+
+    def test_old_profiles_are_rotated(self):
+        token = profiling.make_token()
+        names = [
+            self.client.get(
+                reverse("about:tech"), HTTP_X_PROFILE=token)["X-Profile"]
+            for _ in range(3)
+        ]
+        self.assertEqual(len(profiling.names()), 2)
+        self.assertNotIn(min(names), profiling.names())
+
+    def test_viewer(self):
+        name = self.client.get(
+            reverse("about:author"),
+            HTTP_X_PROFILE=profiling.make_token())["X-Profile"]
+        detail = reverse("profile_detail", args=[name])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(detail).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("profiles"))
+        self.assertContains(response, name)
+        response = self.client.get(detail, {"sort": "tottime"})
+        self.assertContains(response, "about:author")
+        self.assertContains(response, "function calls")
+        response = self.client.get(reverse("profile_download", args=[name]))
+        self.assertGreater(len(b"".join(response.streaming_content)), 0)
+        response = self.client.get(
+            reverse("profile_detail", args=["..secret"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ReplicaTestCase(TransactionTestCase):
+    """Тест с настоящей репликой `replica` — файлом-копией тестовой базы.
+
+    Алиас добавляется после setUpClass, поэтому TransactionTestCase не
+    запрещает к нему запросы и не очищает его. Копия делается backup
+    API, которому нужны закоммиченные данные.
+    """
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases["replica"] = dict(
+            connections["default"].settings_dict,
+            NAME=os.path.join(directory, "replica.sqlite3"),
+        )
+        self.addCleanup(self.remove_replica)
+        # PRAGMA нового соединения не должны тратить бюджет запросов.
+        connections["replica"].ensure_connection()
+        replicas = override_settings(DATABASE_REPLICAS=["replica"])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+    def remove_replica(self):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.databases["replica"]
+
+    def sync(self):
+        call_command("sync_replicas", stdout=StringIO())
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class ReplicaRoutingTest(ReplicaTestCase):
+    def test_get_reads_from_replica(self):
+        self.sync()
+        get_user_model().objects.create_user("written")
+        self.assertEqual(self.client.get("/db/").content, b"replica 0")
+        self.assertEqual(self.client.post("/db/").content, b"default 1")
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.sync()
+        get_user_model().objects.create_user("written")
+        response = self.client.get("/write/")
+        self.assertIn("primary_reads", response.cookies)
+        self.assertEqual(self.client.get("/db/").content, b"default 1")
+
+    def test_primary_block_and_sessions(self):
+        # Модели не импортируются на уровне модуля: его загружают
+        # процессы spawn в тестах выше, где Django не настроен.
+        from django.contrib.sessions.models import Session
+
+        User = get_user_model()
+        with routers.routing(use_replicas=True):
+            self.assertEqual(User.objects.all().db, "replica")
+            self.assertEqual(Session.objects.all().db, "default")
+            with routers.primary():
+                self.assertEqual(User.objects.all().db, "default")
+        self.assertEqual(User.objects.all().db, "default")
+
+
+class ReplicaLagTest(ReplicaTestCase):
+    """Страница, собранная с отстающей реплики, не попадает в кеш тем,
+    кто читает основную базу, и обновляется после sync_replicas."""
+
+    def test_stale_replica_page_is_not_shared(self):
+        from posts.models import Post
+
+        author = get_user_model().objects.create_user("author")
+        Post.objects.create(text="Старый пост", author=author)
+        self.sync()
+        Post.objects.create(text="Новый пост", author=author)
+        index = reverse("posts:index")
+
+        for query in ("", "?page=1"):
+            with self.subTest(query=query):
+                response = self.client.get(index + query)
+                self.assertContains(response, "Старый пост")
+                self.assertNotContains(response, "Новый пост")
+
+                writer = self.client_class()
+                writer.cookies["primary_reads"] = "1"
+                response = writer.get(index + query)
+                self.assertContains(response, "Новый пост")
+                self.assertEqual(
+                    response.context["page_obj"].paginator.count, 2)
+
+        self.sync()
+        self.assertContains(self.client.get(index), "Новый пост")
+
+
+class SQLiteCopyTest(TransactionTestCase):
+    # Backup API ждёт конца транзакции, поэтому данные должны быть
+    # закоммичены, а не откатываться в конце теста.
+    def test_sync_copies_primary(self):
+        get_user_model().objects.create_user("replicated")
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        target = os.path.join(directory, "replica.sqlite3")
+        call_command("sync_replicas", "--to", target, stdout=StringIO())
+        with closing(sqlite3.connect(target)) as replica:
+            (count,), = replica.execute(
+                "SELECT COUNT(*) FROM auth_user WHERE username = ?",
+                ("replicated",),
+            )
+        self.assertEqual(count, 1)
+
+    def test_benchmark_compares_pragmas(self):
+        from posts.models import Post
+
+        user = get_user_model().objects.create_user("writer")
+        Post.objects.create(text="Пост", author=user)
+        output = StringIO()
+        call_command("sqlite_benchmark", "--readers", "1", "--writers", "1",
+                     "--duration", "0.2", stdout=output)
+        self.assertEqual(output.getvalue().count("write: "), 2)
+        self.assertIn("SQLITE_PRAGMAS", output.getvalue())
+
+
+class SQLitePragmasTest(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            for name in ("synchronous", "busy_timeout", "cache_size"):
+                cursor.execute(f"PRAGMA {name}")
+                self.assertEqual(
+                    cursor.fetchone()[0],
+                    {"synchronous": 1, "busy_timeout": 5000,
+                     "cache_size": -64 * 1024}[name],
+                )
+
+
+class RetryOnLockedTest(SimpleTestCase):
+    def setUp(self):
+        self.calls = 0
+        self.request = RequestFactory().post("/")
+
+    def flaky(self, errors):
+        @retry_on_locked(delay=0)
+        def view(request):
+            self.calls += 1
+            if self.calls <= len(errors):
+                raise OperationalError(errors[self.calls - 1])
+            return HttpResponse("ok")
+        return view
+
+    def test_retries_locked_database(self):
+        view = self.flaky(["database is locked"] * 2)
+        self.assertEqual(view(self.request).content, b"ok")
+        self.assertEqual(self.calls, 3)
+
+    def test_gives_up(self):
+        view = self.flaky(["database is locked"] * 5)
+        with self.assertRaises(OperationalError):
+            view(self.request)
+        self.assertEqual(self.calls, 5)
+
+    def test_other_errors_are_not_retried(self):
+        view = self.flaky(["no such table: posts_post"])
+        with self.assertRaises(OperationalError):
+            view(self.request)
+        self.assertEqual(self.calls, 1)
@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics, profiling
+
 
 def csrf_failure(request, reason=""):
     return render(request, "core/custom_handlers/403csrf.html")
@@ -7,3 +13,49 @@ def csrf_failure(request, reason=""):
 
 def page_not_found(request, exception):
     return render(request, "core/custom_handlers/404.html", {"path": request.path}, status=404)
+
+
+def prometheus_metrics(request):
+    """Метрики для Prometheus: сотрудникам и адресам из
+    METRICS_ALLOWED_IPS."""
+    allowed = request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@staff_member_required
+def profiles(request):
+    return render(request, "core/profiles.html", {
+        "entries": profiling.entries(),
+    })
+
+
+@staff_member_required
+def profile_detail(request, name):
+    sort = request.GET.get("sort")
+    if sort not in profiling.SORT_KEYS:
+        sort = profiling.SORT_KEYS[0]
+    try:
+        entry = profiling.load(name)
+        report = profiling.report(name, sort)
+    except FileNotFoundError:
+        raise Http404
+    return render(request, "core/profile_detail.html", {
+        "entry": entry,
+        "report": report,
+        "sort": sort,
+        "sort_keys": profiling.SORT_KEYS,
+    })
+
+
+@staff_member_required
+def profile_download(request, name):
+    try:
+        dump = open(profiling.dump_path(name), "rb")
+    except FileNotFoundError:
+        raise Http404
+    return FileResponse(dump, as_attachment=True, filename=f"{name}.prof")
@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
+
 from .models import Post, Group
+from . import counters, feed, search, thumbnails
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +12,45 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date', 'group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по индексу FTS5 вместо `LIKE '%...%'` по всей таблице."""
+        query = search.make_query(search_term)
+        if not query:
+            return queryset, False
+        return search.filter_posts(queryset, query), False
+
+    def save_model(self, request, obj, form, change):
+        old_group_id = old_author_id = None
+        if change:
+            old_group = form.initial.get("group")
+            old_group_id = getattr(old_group, "pk", old_group)
+            old_author = form.initial.get("author")
+            old_author_id = getattr(old_author, "pk", old_author)
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if change:
+                counters.post_moved(obj, old_group_id)
+                if "author" in form.changed_data:
+                    counters.post_reassigned(obj, old_author_id)
+                    feed.reassign(obj)
+            else:
+                counters.post_added(obj)
+                feed.fan_out(obj)
+            if "image" in form.changed_data:
+                thumbnails.schedule(obj)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            counters.post_removed(obj)
+
+    def delete_queryset(self, request, queryset):
+        posts = list(queryset)
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            for post in posts:
+                counters.post_removed(post)
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
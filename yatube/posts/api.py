@@ -0,0 +1,99 @@
+"""JSON-версии лент для мобильных клиентов и внутренних потребителей.
+
+Ответы поддерживают условные запросы: ETag строится из поколения ленты
+(см. `caching`) и позиции в ней, Last-Modified — по самому свежему посту.
+Если у клиента актуальная версия, он получает 304, и ни выборка постов,
+ни сериализация не выполняются.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+
+from .models import Group, Post, User
+from .paginator import DEFAULT_ORDERING, CursorPaginator
+from . import caching
+
+NUMBER_POSTS = 20
+
+
+def _feed(request, slug=None, username=None):
+    """Имя ленты и её посты; результат запоминается на время запроса."""
+    if not hasattr(request, "_api_feed"):
+        if slug is not None:
+            group = get_object_or_404(Group.objects.only("id"), slug=slug)
+            request._api_feed = (f"group:{group.pk}", group.posts.all())
+        elif username is not None:
+            author = get_object_or_404(
+                User.objects.only("id"), username=username)
+            request._api_feed = (f"profile:{author.pk}", author.posts.all())
+        else:
+            request._api_feed = ("index", Post.objects.all())
+    return request._api_feed
+
+
+def feed_etag(request, **kwargs):
+    feed, _ = _feed(request, **kwargs)
+    version = "|".join((caching.generation(feed), caching.page_key(request)))
+    return hashlib.md5(version.encode()).hexdigest()
+
+
+def feed_last_modified(request, **kwargs):
+    _, posts = _feed(request, **kwargs)
+    return posts.order_by("-pub_date").values_list(
+        "pub_date", flat=True).first()
+
+
+def serialize_post(post):
+    return {
+        "id": post.pk,
+        "text": post.text,
+        "pub_date": post.pub_date,
+        "author": post.author.username,
+        "group": post.group.slug if post.group else None,
+        "image": post.image.url if post.image else None,
+    }
+
+
+def feed_response(request, **kwargs):
+    _, posts = _feed(request, **kwargs)
+    paginator = CursorPaginator(
+        posts.select_related("author", "group"),
+        NUMBER_POSTS,
+        DEFAULT_ORDERING,
+    )
+    page = paginator.get_cursor_page(
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+    )
+    return JsonResponse(
+        {
+            "posts": [serialize_post(post) for post in page],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        },
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+conditional = condition(etag_func=feed_etag,
+                        last_modified_func=feed_last_modified)
+
+
+@require_safe
+@conditional
+def index(request):
+    return feed_response(request)
+
+
+@require_safe
+@conditional
+def group_posts(request, slug):
+    return feed_response(request, slug=slug)
+
+
+@require_safe
+@conditional
+def profile(request, username):
+    return feed_response(request, username=username)
@@ -0,0 +1,408 @@
+"""Нагрузочный бенчмарк: синтетические данные и замер всех страниц.
+
+Данные распределены по степенному закону, как в живой соцсети: у
+немногих авторов тысячи постов и подписчиков, у большинства — единицы;
+группы сильно различаются по размеру, у нескольких постов обсуждения на
+тысячи комментариев. Большие таблицы заполняются `executemany` в обход
+ORM, индекс поиска и счётчики пересчитываются один раз в конце.
+
+Бенчмарк нужно запускать на отдельной базе:
+
+    export YATUBE_DB=/tmp/bench.sqlite3
+    python manage.py migrate
+    python manage.py seed_benchmark --scale 0.01
+    python manage.py run_benchmark --output bench.json
+"""
+import bisect
+import itertools
+import json
+import math
+import random
+import re
+import subprocess
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from faker import Faker
+
+from . import caching, counters, feed, search
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+DATASET = {
+    "users": 100_000,
+    "posts": 5_000_000,
+    "follows": 50_000_000,
+    "groups": 200,
+    "comments": 2_000_000,
+    "hot_threads": 20,
+    "hot_thread_comments": 5_000,
+}
+VIEWER = "bench"
+VIEWER_FOLLOWS = 200
+BATCH_SIZE = 10_000
+TEXT_POOL = 2_000
+FOLLOW_ROUNDS = 10
+HISTORY = timedelta(days=3 * 365)
+URLCONFS = ("posts", "users", "about")
+
+
+def sizes(scale):
+    """Размеры набора данных с масштабом `scale` (1 — полный набор)."""
+    result = {}
+    for name, full in DATASET.items():
+        minimum = 1 if name in ("hot_threads", "groups") else 2
+        result[name] = max(minimum, int(full * scale))
+    result["hot_thread_comments"] = max(
+        2, int(DATASET["hot_thread_comments"] * math.sqrt(scale)))
+    return result
+
+
+class PowerLaw:
+    """Выбор номеров 0..n-1 с весами 1 / (номер + 1) ** exponent."""
+
+    def __init__(self, n, exponent, rng):
+        self.rng = rng
+        weights = ((i + 1) ** -exponent for i in range(n))
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1]
+
+    def sample(self):
+        point = self.rng.random() * self.total
+        return bisect.bisect_left(self.cumulative, point)
+
+
+def _insert(model, fields, rows, ignore=False):
+    """Пачками вставляет строки в таблицу модели, минуя ORM."""
+    columns = ", ".join(model._meta.get_field(name).column
+                        for name in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    verb = "INSERT OR IGNORE" if ignore else "INSERT"
+    sql = (f"{verb} INTO {model._meta.db_table} ({columns})"
+           f" VALUES ({placeholders})")
+    inserted = 0
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(itertools.islice(rows, BATCH_SIZE))
+            if not batch:
+                return inserted
+            with transaction.atomic():
+                cursor.executemany(sql, batch)
+            inserted += len(batch)
+
+
+class Seeder:
+    def __init__(self, scale=1.0, seed=0, log=print):
+        self.sizes = sizes(scale)
+        self.rng = random.Random(seed)
+        self.log = log
+        self.now = timezone.now()
+        faker = Faker("ru_RU")
+        faker.seed_instance(seed)
+        self.texts = [faker.text(200) for _ in range(TEXT_POOL)]
+        self.names = [
+            (faker.first_name(), faker.last_name()) for _ in range(TEXT_POOL)
+        ]
+
+    def _date(self):
+        moment = self.now - HISTORY * self.rng.random()
+        return connection.ops.adapt_datetimefield_value(moment)
+
+    def _step(self, name, func):
+        started = time.monotonic()
+        count = func()
+        elapsed = time.monotonic() - started
+        self.log(f"{name}: {count} за {elapsed:.1f} с "
+                 f"({count / max(elapsed, 1e-9):.0f}/с)")
+        return count
+
+    def run(self):
+        search.drop_triggers()
+        try:
+            self._step("пользователи", self.users)
+            self._step("группы", self.groups)
+            self._step("посты", self.posts)
+            self._step("подписки", self.follows)
+            self._step("комментарии", self.comments)
+            self._step("лента читателя", self.viewer_feed)
+        finally:
+            self._step("поисковый индекс", self.search_index)
+        self._step("счётчики", self.counters)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        caching.bump(caching.GLOBAL_FEED)
+
+    def users(self):
+        password = make_password(VIEWER)
+        joined = connection.ops.adapt_datetimefield_value(self.now)
+        rows = (
+            (f"user{i}", *self.rng.choice(self.names),
+             "", password, False, False, True, joined)
+            for i in range(self.sizes["users"])
+        )
+        fields = ("username", "first_name", "last_name", "email",
+                  "password", "is_superuser", "is_staff", "is_active",
+                  "date_joined")
+        count = _insert(User, fields, rows)
+        # Читатель — последний пользователь: у него меньше всех постов
+        # и подписчиков, а подписок много.
+        User.objects.filter(username=f"user{count - 1}").update(
+            username=VIEWER)
+        self.user_ids = list(
+            User.objects.order_by("id").values_list("id", flat=True))
+        return count
+
+    def groups(self):
+        Group.objects.bulk_create(
+            Group(title=f"Группа {i}", slug=f"group-{i}",
+                  description=self.rng.choice(self.texts)[:200])
+            for i in range(self.sizes["groups"])
+        )
+        self.group_ids = list(
+            Group.objects.order_by("id").values_list("id", flat=True))
+        return len(self.group_ids)
+
+    def posts(self):
+        authors = PowerLaw(len(self.user_ids), 1.1, self.rng)
+        groups = PowerLaw(len(self.group_ids), 1.3, self.rng)
+
+        def rows():
+            for _ in range(self.sizes["posts"]):
+                pub_date = self._date()
+                group_id = None
+                if self.rng.random() < 0.6:
+                    group_id = self.group_ids[groups.sample()]
+                yield (pub_date, pub_date, self.rng.choice(self.texts),
+                       group_id, self.user_ids[authors.sample()], "", 0, 0)
+
+        fields = ("pub_date", "updated_at", "text", "group", "author",
+                  "image", "comments_count", "trend_score")
+        return _insert(Post, fields, rows())
+
+    def follows(self):
+        authors = PowerLaw(len(self.user_ids), 1.0, self.rng)
+        viewer_id = self.user_ids[-1]
+        viewer_authors = set()
+        while len(viewer_authors) < min(VIEWER_FOLLOWS,
+                                        len(self.user_ids) - 1):
+            author_id = self.user_ids[authors.sample()]
+            if author_id != viewer_id:
+                viewer_authors.add(author_id)
+        _insert(Follow, ("user", "author"),
+                ((viewer_id, author_id) for author_id in viewer_authors))
+
+        # У популярных авторов подписчики быстро кончаются, и часть пар
+        # повторяется; такие пары отбрасываются и добираются новым кругом.
+        users = len(self.user_ids)
+        target = min(self.sizes["follows"], users * (users - 1) // 2)
+        followers = self.user_ids[:-1]
+        for _ in range(FOLLOW_ROUNDS):
+            missing = target - Follow.objects.count()
+            if missing <= 0:
+                break
+            rows = (
+                (self.rng.choice(followers), self._followed(authors))
+                for _ in range(missing)
+            )
+            _insert(Follow, ("user", "author"),
+                    (row for row in rows if row[0] != row[1]), ignore=True)
+        return Follow.objects.count()
+
+    def _followed(self, authors):
+        # Половина подписок — на популярных авторов, остальные — на любых.
+        if self.rng.random() < 0.5:
+            return self.user_ids[authors.sample()]
+        return self.rng.choice(self.user_ids)
+
+    def comments(self):
+        bounds = Post.objects.aggregate(first=Min("id"), last=Max("id"))
+        first, last = bounds["first"], bounds["last"]
+        hot = self.rng.sample(range(first, last + 1),
+                              min(self.sizes["hot_threads"], last - first))
+
+        def rows():
+            for post_id in hot:
+                for _ in range(self.sizes["hot_thread_comments"]):
+                    yield self._comment(post_id)
+            for _ in range(self.sizes["comments"]):
+                yield self._comment(self.rng.randint(first, last))
+
+        return _insert(Comment, ("post", "author", "text", "pub_date"),
+                       rows())
+
+    def _comment(self, post_id):
+        return (post_id, self.rng.choice(self.user_ids),
+                self.rng.choice(self.texts)[:100], self._date())
+
+    def viewer_feed(self):
+        viewer = User.objects.get(username=VIEWER)
+        for follow in Follow.objects.filter(user=viewer).select_related(
+                "author"):
+            feed.backfill(viewer, follow.author)
+        return viewer.feed.count()
+
+    def search_index(self):
+        search.rebuild()
+        search.install_triggers()
+        return Post.objects.count()
+
+    def counters(self):
+        counters.rebuild()
+        return UserStats.objects.count()
+
+
+def percentile(values, fraction):
+    """Процентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _targets():
+    """Аргументы адресов: самые большие и типичные группы, авторы, посты."""
+    groups = Group.objects.order_by("-posts_count")
+    authors = User.objects.filter(stats__isnull=False).order_by(
+        "-stats__posts_count")
+    posts = Post.objects.order_by("-comments_count")
+    median = authors.count() // 2
+    return {
+        "slug": {
+            "largest": groups.values_list("slug", flat=True).first(),
+            "smallest": groups.reverse().values_list(
+                "slug", flat=True).first(),
+        },
+        "username": {
+            "top": authors.values_list("username", flat=True).first(),
+            "median": authors.values_list(
+                "username", flat=True)[median:median + 1].get(),
+        },
+        "post_id": {
+            "hot": posts.values_list("id", flat=True).first(),
+            "plain": posts.filter(comments_count__lte=1).values_list(
+                "id", flat=True).first(),
+        },
+    }
+
+
+def _url_names():
+    for pattern in get_resolver().url_patterns:
+        if not isinstance(pattern, URLResolver):
+            continue
+        if pattern.namespace not in URLCONFS:
+            continue
+        for child in pattern.url_patterns:
+            yield (f"{pattern.namespace}:{child.name}",
+                   list(child.pattern.converters))
+
+
+# Адреса, которые пишут в базу даже на GET. С ними каждый прогон мерил
+# бы уже другие данные, поэтому в замеры они не входят.
+WRITE_URLS = {
+    "posts:profile_follow",
+    "posts:profile_unfollow",
+    "users:logout",
+}
+
+QUERY_VARIANTS = {
+    "posts:index": {"": "", "page-100": "?page=100"},
+    "posts:search": {"": "?q={word}"},
+}
+
+
+def cases():
+    """(название, путь) для каждого адреса и варианта аргументов."""
+    targets = _targets()
+    word = Post.objects.values_list("text", flat=True).first().split()[0]
+    for name, params in _url_names():
+        if name in WRITE_URLS:
+            continue
+        if params:
+            variants = [
+                (f"[{label}]", {param: value})
+                for param in params[:1]
+                for label, value in targets.get(param, {}).items()
+                if value is not None
+            ]
+        else:
+            variants = [("", {})]
+        for label, kwargs in variants:
+            path = reverse(name, kwargs=kwargs)
+            queries = QUERY_VARIANTS.get(name, {"": ""})
+            for query_label, query in queries.items():
+                suffix = f"[{query_label}]" if query_label else ""
+                yield (f"{name}{label}{suffix}",
+                       path + query.format(word=word.strip(".,")))
+
+
+SERVER_TIMING = re.compile(r'desc="(\d+) queries"')
+
+
+def measure(repeat=20, log=print):
+    """Запрашивает каждый адрес `repeat` раз от имени читателя `bench`."""
+    viewer = User.objects.get(username=VIEWER)
+    client = Client()
+    client.force_login(viewer)
+    results = {}
+    for name, path in cases():
+        timings = []
+        queries = []
+        statuses = set()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(path)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            timings.append((time.perf_counter() - started) * 1000)
+            statuses.add(response.status_code)
+            match = SERVER_TIMING.search(response.get("Server-Timing", ""))
+            if match:
+                queries.append(int(match.group(1)))
+        results[name] = {
+            "path": path,
+            "status": sorted(statuses),
+            "first_ms": round(timings[0], 2),
+            "p50_ms": round(percentile(timings, 0.50), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2),
+            "p99_ms": round(percentile(timings, 0.99), 2),
+            "queries": max(queries) if queries else None,
+        }
+        log(f"{name}: p50 {results[name]['p50_ms']} мс, "
+            f"запросов {results[name]['queries']}")
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, repeat):
+    return json.dumps(
+        {
+            "commit": _commit(),
+            "repeat": repeat,
+            "dataset": {
+                "users": User.objects.count(),
+                "posts": Post.objects.count(),
+                "follows": Follow.objects.count(),
+                "groups": Group.objects.count(),
+                "comments": Comment.objects.count(),
+            },
+            "urls": results,
+        },
+        ensure_ascii=False,
+        indent=2,
+        sort_keys=True,
+    )
@@ -0,0 +1,101 @@
+"""Версии (поколения) лент для кеша фрагментов шаблонов.
+
+Ключ закешированного фрагмента включает номер поколения ленты, а сигналы
+моделей увеличивают его при любом изменении данных. Старые фрагменты
+перестают находиться по ключу и просто вытесняются, поэтому время жизни
+кеша можно делать большим, не боясь показать устаревшую страницу.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import routers
+
+GLOBAL_FEED = "all"
+
+
+def _key(feed):
+    return f"feed-generation:{feed}"
+
+
+def _initial_generation():
+    # Поколение, потерянное при вытеснении из кеша, начинается заново
+    # с текущего времени и не совпадает ни с одним из прежних номеров.
+    return time.time_ns() // 1000
+
+
+def replica_feed(alias):
+    """Снимок реплики: `sync_replicas` меняет его поколение при копировании.
+
+    Реплика отстаёт от основной базы, а поколения лент растут сразу
+    при записи. Без снимка в ключе страница, прочитанная с реплики,
+    легла бы в кеш под новым поколением и досталась бы и тем, кто
+    читает основную базу.
+    """
+    return f"replica:{alias}"
+
+
+def generation(*feeds):
+    """Текущая версия набора лент одной строкой вида `лента=поколение`."""
+    feeds = (GLOBAL_FEED,) + feeds
+    replica = routers.replica()
+    if replica is not None:
+        feeds += (replica_feed(replica),)
+    keys = [_key(feed) for feed in feeds]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial_generation(), timeout=None)
+            values[key] = cache.get(key)
+    return ";".join(
+        f"{feed}={values[key]}" for feed, key in zip(feeds, keys)
+    )
+
+
+def bump(*feeds):
+    """Делает недействительными закешированные страницы лент."""
+    for feed in feeds:
+        try:
+            cache.incr(_key(feed))
+        except ValueError:
+            cache.add(_key(feed), _initial_generation(), timeout=None)
+
+
+def count(feed, queryset):
+    """Число записей ленты; COUNT(*) выполняется раз на поколение ленты."""
+    key = f"feed-count:{feed}:{generation(feed)}"
+    value = cache.get(key)
+    if value is None:
+        value = queryset.count()
+        cache.set(key, value, settings.FEED_CACHE_TIMEOUT)
+    return value
+
+
+def post_feeds(post, *group_ids):
+    """Ленты, в которых показан пост (и группы, где он был раньше)."""
+    feeds = {
+        "index",
+        f"profile:{post.author_id}",
+        f"post:{post.pk}",
+    }
+    for group_id in (post.group_id,) + group_ids:
+        if group_id is not None:
+            feeds.add(f"group:{group_id}")
+    return feeds
+
+
+def page_key(request):
+    """Позиция в ленте: номер страницы или курсор."""
+    return "|".join(
+        request.GET.get(name, "") for name in ("page", "after", "before")
+    )
+
+
+def fragment_context(request, *feeds):
+    """Переменные для тега `{% cache %}` в шаблонах лент."""
+    return {
+        "cache_timeout": settings.FEED_CACHE_TIMEOUT,
+        "cache_version": generation(*feeds),
+        "cache_page": page_key(request),
+    }
@@ -0,0 +1,158 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными `UPDATE ... SET x = x + 1` в той же
+транзакции, что и сами записи. Если счётчик всё же разошёлся с данными,
+его чинит команда `manage.py recount`.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _shift(queryset, **deltas):
+    return queryset.update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def _shift_user(user_id, **deltas):
+    if not _shift(UserStats.objects.filter(user_id=user_id), **deltas):
+        recount_user(user_id)
+
+
+def _shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def post_added(post):
+    _shift_user(post.author_id, posts_count=1)
+    _shift_group(post.group_id, 1)
+
+
+def post_removed(post):
+    _shift_user(post.author_id, posts_count=-1)
+    _shift_group(post.group_id, -1)
+
+
+def post_moved(post, old_group_id):
+    """Пост перенесли из группы `old_group_id` в `post.group_id`."""
+    if old_group_id != post.group_id:
+        _shift_group(old_group_id, -1)
+        _shift_group(post.group_id, 1)
+
+
+def post_reassigned(post, old_author_id):
+    """Пост передали от `old_author_id` автору `post.author_id`."""
+    if old_author_id != post.author_id:
+        _shift_user(old_author_id, posts_count=-1)
+        _shift_user(post.author_id, posts_count=1)
+
+
+def comment_added(comment, trend_score=0):
+    """`trend_score` — прирост популярности поста, см. `trending`."""
+    _shift(Post.objects.filter(pk=comment.post_id),
+           comments_count=1, trend_score=trend_score)
+
+
+def follow_added(follow):
+    _shift_user(follow.user_id, following_count=1)
+    _shift_user(follow.author_id, followers_count=1)
+
+
+def follow_removed(follow):
+    _shift_user(follow.user_id, following_count=-1)
+    _shift_user(follow.author_id, followers_count=-1)
+
+
+def follow_feed_count(user):
+    """Число постов в ленте подписок — сумма счётчиков авторов, на которых
+    подписан пользователь, вместо COUNT(*) по его записям `FeedItem`."""
+    return UserStats.objects.filter(
+        user_id__in=Follow.objects.filter(user=user).values("author_id"),
+    ).aggregate(total=Sum("posts_count"))["total"] or 0
+
+
+def _count(model, field, outer="pk"):
+    rows = model.objects.filter(
+        **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(total=Count("pk")).values("total")
+    return Coalesce(Subquery(rows), 0)
+
+
+USER_COUNTERS = {
+    "posts_count": (Post, "author"),
+    "followers_count": (Follow, "author"),
+    "following_count": (Follow, "user"),
+}
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики одного пользователя по данным."""
+    values = User.objects.filter(pk=user_id).annotate(**{
+        name: _count(model, field)
+        for name, (model, field) in USER_COUNTERS.items()
+    }).values(*USER_COUNTERS).first()
+    if values is None:
+        return None
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=values,
+    )
+    return stats
+
+
+def stats_for(user):
+    """Счётчики пользователя; недостающая строка создаётся пересчётом."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def _repair(queryset, field, actual):
+    drifted = queryset.annotate(actual=actual).exclude(**{field: F("actual")})
+    fixed = 0
+    for pk, value in list(drifted.values_list("pk", "actual")):
+        queryset.filter(pk=pk).update(**{field: value})
+        fixed += 1
+    return fixed
+
+
+def _create_missing_stats():
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        "pk", flat=True)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in missing.iterator()],
+        batch_size=500,
+    )
+
+
+def recount():
+    """Чинит все разошедшиеся счётчики. Возвращает число исправлений."""
+    _create_missing_stats()
+    fixed = {
+        "group.posts_count": _repair(
+            Group.objects.all(), "posts_count", _count(Post, "group")),
+        "post.comments_count": _repair(
+            Post.objects.all(), "comments_count", _count(Comment, "post")),
+    }
+    for name, (model, field) in USER_COUNTERS.items():
+        fixed[f"userstats.{name}"] = _repair(
+            UserStats.objects.all(), name, _count(model, field, "user_id"))
+    return fixed
+
+
+def rebuild():
+    """Вычисляет все счётчики заново, по одному UPDATE на поле.
+
+    В отличие от `recount()` не ищет расхождения построчно, поэтому
+    подходит для только что залитых данных, где неверно почти всё.
+    """
+    _create_missing_stats()
+    Group.objects.update(posts_count=_count(Post, "group"))
+    Post.objects.update(comments_count=_count(Comment, "post"))
+    UserStats.objects.update(**{
+        name: _count(model, field, "user_id")
+        for name, (model, field) in USER_COUNTERS.items()
+    })
@@ -0,0 +1,134 @@
+"""Потоковая выгрузка постов, комментариев и подписок пользователя.
+
+Записи читаются из базы порциями через `values().iterator()` и сразу
+отдаются наружу, поэтому память не растёт с числом постов автора.
+Архив zip пишется в поток без перемотки, картинки копируются в него
+по частям.
+"""
+import json
+import posixpath
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import Comment, Follow
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+
+def _dump(record):
+    return json.dumps(
+        record, cls=DjangoJSONEncoder, ensure_ascii=False,
+    ).encode() + b"\n"
+
+
+def posts(user):
+    return user.posts.order_by("id").values(
+        "id", "text", "pub_date", "updated_at", "image",
+        group_slug=F("group__slug"),
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def comments(user):
+    return Comment.objects.filter(author=user).order_by("id").values(
+        "id", "post_id", "text", "pub_date",
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def follows(user):
+    return Follow.objects.filter(user=user).order_by("id").values(
+        username=F("author__username"),
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+SECTIONS = (
+    ("post", posts),
+    ("comment", comments),
+    ("follow", follows),
+)
+
+
+def _buffered(chunks):
+    """Склеивает мелкие куски, чтобы не отдавать клиенту по строчке."""
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def ndjson(user):
+    """Одна запись в строке; поле `type` — post, comment или follow."""
+    return _buffered(
+        _dump({"type": kind, **row})
+        for kind, rows in SECTIONS
+        for row in rows(user)
+    )
+
+
+class _Sink:
+    """Файл только для записи, из которого забирают накопленные байты."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def archive(user):
+    """Zip с posts.ndjson, comments.ndjson, follows.ndjson и images/."""
+    return _buffered(_archive(user))
+
+
+def _archive(user):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for kind, rows in SECTIONS:
+            with zf.open(f"{kind}s.ndjson", "w", force_zip64=True) as entry:
+                for row in rows(user):
+                    entry.write(_dump(row))
+                    yield sink.drain()
+        images = user.posts.exclude(image="").order_by("id").values_list(
+            "image", flat=True).iterator(chunk_size=CHUNK_SIZE)
+        for name in images:
+            yield from _copy_image(zf, sink, name)
+    yield sink.drain()
+
+
+def _copy_image(zf, sink, name):
+    if not default_storage.exists(name):
+        return
+    arcname = posixpath.join("images", posixpath.basename(name))
+    # Картинки уже сжаты, поэтому кладём их без повторного сжатия.
+    info = zipfile.ZipInfo(arcname)
+    info.compress_type = zipfile.ZIP_STORED
+    with default_storage.open(name) as source:
+        with zf.open(info, "w", force_zip64=True) as entry:
+            for chunk in source.chunks():
+                entry.write(chunk)
+                yield sink.drain()
+
+
+FORMATS = {
+    "ndjson": (ndjson, "application/x-ndjson", "ndjson"),
+    "zip": (archive, "application/zip", "zip"),
+}
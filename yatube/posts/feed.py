@@ -0,0 +1,77 @@
+import itertools
+
+from django.db.models import F
+
+from .models import FeedItem, Follow, Post
+
+FEED_ORDERING = ("-feed_pub_date", "-feed_item_id")
+BATCH_SIZE = 500
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id,
+    ).values_list("user_id", flat=True)
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def reassign(post):
+    """У поста сменился автор: пост уходит из лент подписчиков прежнего
+    автора и раскладывается подписчикам нового."""
+    FeedItem.objects.filter(post=post).delete()
+    fan_out(post)
+
+
+def fan_out_after(post_id):
+    """Раскладывает по лентам подписчиков все посты с id больше `post_id`,
+    например после массового импорта. Посты, созданные за это время
+    через сайт, уже разложены `fan_out` и пропускаются."""
+    rows = Follow.objects.filter(
+        author__posts__id__gt=post_id,
+    ).values_list(
+        "user_id", "author__posts__id", "author__posts__pub_date",
+    ).iterator()
+    while True:
+        batch = [
+            FeedItem(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for user_id, pk, pub_date in itertools.islice(
+                rows, BATCH_SIZE)
+        ]
+        if not batch:
+            return
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(user, author):
+    """Добавляет в ленту пользователя уже написанные посты автора."""
+    posts = author.posts.values_list("id", "pub_date")
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user=user, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def drop(user, author):
+    """Убирает посты автора из ленты пользователя после отписки."""
+    FeedItem.objects.filter(user=user, post__author=author).delete()
+
+
+def follow_feed(user):
+    """Посты ленты подписок: один проход по индексу (user, pub_date)."""
+    return Post.objects.filter(
+        feed_entries__user=user,
+    ).annotate(
+        feed_pub_date=F("feed_entries__pub_date"),
+        feed_item_id=F("feed_entries__id"),
+    ).select_related("author", "group")
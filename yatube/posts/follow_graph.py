@@ -0,0 +1,65 @@
+"""Граф подписок в кеше: на кого подписан каждый пользователь.
+
+Подписки пользователя лежат в кеше одним значением — отсортированным
+массивом id авторов (`array("I")`, 4 байта на подписку). Проверка
+«подписан ли я на автора» — одно чтение кеша и двоичный поиск вместо
+SQL-запроса. Массив загружается из основной базы при первом обращении
+и сбрасывается сигналами при подписке и отписке.
+"""
+import hashlib
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import routers
+
+from .models import Follow
+
+
+def _key(user_id):
+    return f"follow-graph:{user_id}"
+
+
+def following(user_id):
+    """Отсортированный массив id авторов, на которых подписан пользователь."""
+    result = array("I")
+    if user_id is None:
+        return result
+    data = cache.get(_key(user_id))
+    if data is not None:
+        result.frombytes(data)
+        return result
+    result.extend(
+        Follow.objects.using(routers.PRIMARY).filter(
+            user_id=user_id,
+        ).order_by("author_id").values_list("author_id", flat=True)
+    )
+    cache.set(_key(user_id), result.tobytes(), settings.FEED_CACHE_TIMEOUT)
+    return result
+
+
+def is_following(user_id, author_id):
+    authors = following(user_id)
+    position = bisect_left(authors, author_id)
+    return position < len(authors) and authors[position] == author_id
+
+
+def following_count(user_id):
+    return len(following(user_id))
+
+
+def fingerprint(user_id):
+    """Версия подписок пользователя для ETag: меняется при любой
+    подписке и отписке, а не только при изменении их числа."""
+    return hashlib.md5(following(user_id).tobytes()).hexdigest()
+
+
+def invalidate(user_id):
+    """Сбрасывает подписки пользователя сразу и ещё раз после коммита:
+    иначе параллельный запрос мог бы закешировать их до коммита."""
+    key = _key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -2,6 +2,16 @@ from django import forms
 from .models import Post, Group, Comment
 
 
+class BoundedImageField(forms.ImageField):
+    """Показывает причину, по которой обработчик загрузки отверг файл."""
+
+    def to_python(self, data):
+        upload_error = getattr(data, "upload_error", None)
+        if upload_error:
+            raise forms.ValidationError(upload_error, code="upload_rejected")
+        return super().to_python(data)
+
+
 class PostForm(forms.ModelForm):
     text = forms.CharField(
         widget=forms.Textarea,
@@ -17,6 +27,7 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ("text", "group", "image")
+        field_classes = {"image": BoundedImageField}
 
     def clean_text(self):
         data = self.cleaned_data['text']
@@ -0,0 +1,26 @@
+"""Уменьшение слишком больших оригиналов картинок постов."""
+from django.conf import settings
+from PIL import Image
+from sorl import thumbnail
+
+
+def cap_original(post):
+    """Пережимает оригинал до `MAX_IMAGE_SIDE` по большей стороне.
+
+    Возвращает True, если файл был изменён. Старые миниатюры при этом
+    удаляются: они сделаны из прежнего файла.
+    """
+    limit = settings.MAX_IMAGE_SIDE
+    with post.image.open("rb"):
+        with Image.open(post.image) as image:
+            if max(image.size) <= limit:
+                return False
+            image_format = image.format
+            image.thumbnail((limit, limit), Image.LANCZOS)
+            capped = image.copy()
+    thumbnail.delete(post.image, delete_file=False)
+    with post.image.storage.open(post.image.name, "wb") as target:
+        if image_format == "JPEG" and capped.mode not in ("RGB", "L"):
+            capped = capped.convert("RGB")
+        capped.save(target, format=image_format)
+    return True
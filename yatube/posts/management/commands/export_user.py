@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = "Выгружает посты, комментарии и подписки пользователя."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument(
+            "--format",
+            choices=tuple(export.FORMATS),
+            default="ndjson",
+        )
+        parser.add_argument(
+            "--output",
+            help="Файл для выгрузки; по умолчанию stdout.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError("Нет такого пользователя.")
+        stream = export.FORMATS[options["format"]][0]
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                output.writelines(stream(user))
+        else:
+            sys.stdout.buffer.writelines(stream(user))
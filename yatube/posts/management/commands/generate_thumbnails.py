@@ -0,0 +1,36 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import tasks, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Создаёт миниатюры для всех картинок постов в несколько процессов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Число процессов.",
+        )
+
+    def handle(self, *args, **options):
+        post_ids = Post.objects.exclude(image="").values_list("id", flat=True)
+        executor = ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=tasks.init_worker,
+        )
+        done = 0
+        with executor:
+            results = executor.map(
+                thumbnails.generate, post_ids.iterator(), chunksize=16)
+            for _ in results:
+                done += 1
+                if done % 1000 == 0:
+                    self.stdout.write(f"Готово: {done}")
+        self.stdout.write(self.style.SUCCESS(f"Миниатюры созданы: {done}"))
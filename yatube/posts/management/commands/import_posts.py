@@ -0,0 +1,210 @@
+import csv
+import json
+import os
+import sys
+import time
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import caching, counters, feed
+from posts.models import Group, Post, User
+
+REPORT_EVERY = 10000
+
+
+def read_rows(stream, fmt, skip):
+    """Построчно читает записи из JSONL или CSV, не загружая файл целиком.
+
+    Строки, которые не разбираются как JSON, отдаются в `skip`.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            skip(line, "некорректный JSON")
+
+
+def parse_pub_date(value):
+    """Дата из файла с часовым поясом; пустая — текущий момент."""
+    if not value:
+        return timezone.now()
+    try:
+        pub_date = parse_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if pub_date is not None and timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date
+
+
+def insert_posts(posts):
+    """Вставляет посты с датами из файла.
+
+    `bulk_create` подставил бы вместо `pub_date` текущее время
+    (`auto_now_add`), поэтому значения полей берутся из объектов как
+    есть, как при загрузке фикстур (`raw`). Само поле модели не меняется.
+    """
+    fields = [field for field in Post._meta.concrete_fields
+              if not field.primary_key]
+    # Как и в `bulk_create`: SQLite ограничивает число параметров и
+    # строк в одном INSERT.
+    size = max(connection.ops.bulk_batch_size(fields, posts), 1)
+    for start in range(0, len(posts), size):
+        Post.objects._insert(
+            posts[start:start + size], fields=fields, raw=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует посты из JSONL или CSV с полями text, author, "
+        "group, pub_date, image."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл с постами, «-» — stdin.")
+        parser.add_argument(
+            "--format",
+            choices=("jsonl", "csv"),
+            help="Формат входа; по умолчанию по расширению файла.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Постов в одной транзакции.",
+        )
+        parser.add_argument(
+            "--images",
+            help="Каталог, относительно которого заданы пути картинок.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or (
+            "csv" if path.endswith(".csv") else "jsonl")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+        self.images = options["images"]
+        self.authors = dict(User.objects.values_list("username", "id"))
+        self.groups = dict(Group.objects.values_list("slug", "id"))
+        self.image_field = Post._meta.get_field("image")
+        self.skipped = 0
+
+        if path == "-":
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, encoding="utf-8", newline="")
+            except OSError as error:
+                raise CommandError(error)
+
+        last_id = Post.objects.aggregate(last=Max("id"))["last"] or 0
+        self.imported = 0
+        self.started = time.monotonic()
+        # Триггеры поиска остаются на месте: сайт работает во время
+        # импорта, и правки его постов должны попадать в индекс.
+        try:
+            with stream:
+                self.import_rows(
+                    read_rows(stream, fmt, self.skip), options["batch_size"])
+        finally:
+            # И после ошибки: уже вставленные пачки должны попасть в
+            # ленты, счётчики и кеш страниц.
+            with transaction.atomic():
+                feed.fan_out_after(last_id)
+                counters.recount()
+            caching.bump(caching.GLOBAL_FEED)
+        self.report()
+        if self.skipped:
+            self.stdout.write(self.style.WARNING(
+                f"Пропущено записей: {self.skipped}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано постов: {self.imported}. Миниатюры создаст "
+            f"команда generate_thumbnails."))
+
+    def import_rows(self, rows, batch_size):
+        batch = []
+        try:
+            for row in rows:
+                post = self.build(row)
+                if post is not None:
+                    batch.append(post)
+                if len(batch) == batch_size:
+                    self.insert(batch)
+                    batch = []
+            if batch:
+                self.insert(batch)
+                batch = []
+        except BaseException:
+            # Картинки постов, которые не попали в базу.
+            for post in batch:
+                if post.image:
+                    default_storage.delete(post.image.name)
+            raise
+
+    def insert(self, batch):
+        with transaction.atomic():
+            insert_posts(batch)
+        before = self.imported
+        self.imported += len(batch)
+        if self.imported // REPORT_EVERY > before // REPORT_EVERY:
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.imported / elapsed if elapsed else 0
+        self.stdout.write(f"{self.imported} постов, {rate:.0f} в секунду")
+
+    def skip(self, row, reason):
+        self.skipped += 1
+        self.stderr.write(f"Пропуск ({reason}): {row}")
+
+    def build(self, row):
+        if not isinstance(row, dict):
+            return self.skip(row, "запись не объект")
+        author_id = self.authors.get(row.get("author"))
+        if author_id is None:
+            return self.skip(row, "нет автора")
+        group_id = None
+        if row.get("group"):
+            group_id = self.groups.get(row["group"])
+            if group_id is None:
+                return self.skip(row, "нет группы")
+        pub_date = parse_pub_date(row.get("pub_date"))
+        if pub_date is None:
+            return self.skip(row, "некорректная дата")
+        post = Post(
+            text=row.get("text", ""),
+            author_id=author_id,
+            group_id=group_id,
+            pub_date=pub_date,
+            updated_at=pub_date,
+        )
+        if row.get("image"):
+            if self.images is None:
+                return self.skip(row, "картинки без --images")
+            try:
+                post.image = self.copy_image(post, row["image"])
+            except OSError:
+                return self.skip(row, "нет файла картинки")
+        return post
+
+    def copy_image(self, post, relative_path):
+        """Копирует картинку в MEDIA_ROOT/posts/ по частям."""
+        source = os.path.join(self.images, relative_path)
+        with open(source, "rb") as image:
+            name = self.image_field.generate_filename(
+                post, os.path.basename(source))
+            return default_storage.save(name, File(image))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import caching, recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает рекомендации «на кого подписаться» для всех "
+        "пользователей. Запускается раз в сутки."
+    )
+
+    def handle(self, *args, **options):
+        engine = "SciPy" if recommendations.sparse is not None else "Python"
+        started = time.monotonic()
+        saved = recommendations.save(recommendations.compute())
+        caching.bump(recommendations.FEED)
+        self.stdout.write(self.style.SUCCESS(
+            f"Рекомендаций: {saved} за {time.monotonic() - started:.1f} с "
+            f"({engine})."
+        ))
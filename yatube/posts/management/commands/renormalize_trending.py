@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит эпоху популярных постов на текущий момент и уменьшает "
+        "их оценки. Запускается раз в сутки."
+    )
+
+    def handle(self, *args, **options):
+        changed = trending.renormalize()
+        self.stdout.write(self.style.SUCCESS(
+            f"Оценки перенормированы: {changed} постов."))
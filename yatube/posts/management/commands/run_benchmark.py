@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Запрашивает все страницы posts, users и about на данных "
+        "seed_benchmark и выводит p50/p95/p99 и число SQL-запросов в JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--output",
+            help="Файл для отчёта; по умолчанию stdout.",
+        )
+
+    def handle(self, *args, **options):
+        if not User.objects.filter(username=benchmark.VIEWER).exists():
+            raise CommandError("Сначала выполните seed_benchmark.")
+        results = benchmark.measure(
+            repeat=options["repeat"], log=self.stderr.write)
+        report = benchmark.report(results, options["repeat"])
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report)
+        else:
+            sys.stdout.write(report + "\n")
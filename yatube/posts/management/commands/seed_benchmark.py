@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет пустую базу синтетическими данными для бенчмарка: "
+        "100 тыс. пользователей, 5 млн постов, 50 млн подписок при "
+        "--scale 1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=0.01,
+            help="Доля от полного набора данных.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Заполнять, даже если в базе уже есть данные.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["force"] and (
+                User.objects.exists() or Post.objects.exists()):
+            raise CommandError(
+                "База не пуста. Укажите отдельную базу через YATUBE_DB "
+                "или добавьте --force."
+            )
+        seeder = benchmark.Seeder(
+            scale=options["scale"],
+            seed=options["seed"],
+            log=self.stdout.write,
+        )
+        for name, size in seeder.sizes.items():
+            self.stdout.write(f"{name}: {size}")
+        seeder.run()
+        self.stdout.write(self.style.SUCCESS("Данные для бенчмарка готовы."))
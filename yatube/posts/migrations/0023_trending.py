@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_epoch(apps, schema_editor):
+    TrendEpoch = apps.get_model('posts', 'TrendEpoch')
+    TrendEpoch.objects.create(pk=1, started=django.utils.timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendEpoch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(verbose_name='Начало эпохи')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trend_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['trend_score'], name='post_trend_score_idx'),
+        ),
+        migrations.RunPython(create_epoch, migrations.RunPython.noop),
+    ]
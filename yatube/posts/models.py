@@ -19,6 +19,11 @@ class Group(models.Model):
     description = models.TextField(
         max_length=200,
     )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
@@ -54,12 +59,55 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    trend_score = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.text[:self.PRINT_TEXT_LENGHT]
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(
+                fields=["pub_date"],
+                name="post_pub_date_idx",
+            ),
+            models.Index(
+                fields=["author", "pub_date"],
+                name="post_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=["group", "pub_date"],
+                name="post_group_pub_date_idx",
+            ),
+            models.Index(
+                fields=["author", "updated_at"],
+                name="post_author_updated_at_idx",
+            ),
+            models.Index(
+                fields=["trend_score"],
+                name="post_trend_score_idx",
+            ),
+        ]
+
+
+class TrendEpoch(models.Model):
+    """Момент, к которому приведены оценки `Post.trend_score`."""
+    started = models.DateTimeField(
+        verbose_name='Начало эпохи',
+    )
 
 
 class Comment(CreatedModel):
@@ -84,6 +132,14 @@ class Comment(CreatedModel):
         related_name="comments",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "pub_date"],
+                name="comment_post_pub_date_idx",
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -98,3 +154,99 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name="following",
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"],
+                name="unique_follow",
+            ),
+        ]
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        on_delete=models.CASCADE,
+        related_name="feed",
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+    )
+    pub_date = models.DateTimeField(
+        verbose_name="Дата публикации",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"],
+                name="unique_feed_item",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "pub_date"],
+                name="feed_user_pub_date_idx",
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT(*)."""
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name="stats",
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Количество подписок',
+        default=0,
+    )
+
+
+class Recommendation(models.Model):
+    """Автор, на которого стоит подписаться (считает команда recommend)."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        on_delete=models.CASCADE,
+        related_name="recommendations",
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    score = models.FloatField(
+        verbose_name='Оценка',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"],
+                name="unique_recommendation",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-score", "author"],
+                name="recommendation_user_score_idx",
+            ),
+        ]
@@ -0,0 +1,262 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+DEFAULT_ORDERING = ("-pub_date", "-id")
+ELLIPSIS = "…"
+
+
+def _dump_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        parsed = parse_datetime(value["dt"])
+        if parsed is None:
+            raise ValueError("Некорректная дата в курсоре")
+        return parsed
+    return value
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    payload = json.dumps(
+        [_dump_value(value) for value in values],
+        separators=(",", ":"),
+    )
+    token = base64.urlsafe_b64encode(payload.encode())
+    return token.decode().rstrip("=")
+
+
+def decode_cursor(token, fields):
+    """Распаковывает токен и приводит значения к типам полей ключа
+    сортировки (`field.to_python`). Для испорченного или подделанного
+    токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padding = "=" * (-len(token) % 4)
+        payload = base64.urlsafe_b64decode(token + padding)
+        values = [_load_value(value) for value in json.loads(payload)]
+        if len(values) != len(fields):
+            return None
+        values = [
+            field.to_python(value) for field, value in zip(fields, values)
+        ]
+    except (binascii.Error, ValueError, TypeError, KeyError,
+            ValidationError):
+        return None
+    if None in values:
+        return None
+    return values
+
+
+class CountedPage(Page):
+    """Страница `CountedPaginator`. Как и `CursorPage`, выбирает объекты
+    лениво: страница из кеша фрагментов в базу не ходит."""
+
+    def __init__(self, paginator, number):
+        self.paginator = paginator
+        self.number = number
+
+    @cached_property
+    def object_list(self):
+        rows, self.number = self.paginator.fetch(self.number)
+        return rows
+
+
+class CountedPaginator(Paginator):
+    """Обычный пагинатор, которому число объектов передают готовым
+    (из денормализованного счётчика) вместо COUNT(*).
+
+    Счётчик расходится с данными после записи в обход `counters`
+    (`bulk_create`, консоль, фикстуры) до `manage.py recount`. Поэтому
+    страница выбирается с одной лишней строкой, и если она не сходится
+    со счётчиком, число объектов считается настоящим COUNT(*).
+    """
+
+    def __init__(self, object_list, per_page, count):
+        super().__init__(object_list, per_page)
+        self.known_count = count
+        self.verified = False
+
+    @cached_property
+    def count(self):
+        return self.known_count
+
+    def _recount(self):
+        """Заменяет счётчик на COUNT(*); False, если это уже сделано."""
+        if self.verified:
+            return False
+        self.verified = True
+        self.known_count = self.object_list.count()
+        for name in ("count", "num_pages"):
+            self.__dict__.pop(name, None)
+        return True
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Страница за концом: возможно, счётчик отстал от данных.
+            if int(number) > 1 and self._recount():
+                return self.validate_number(number)
+            raise
+
+    def page(self, number):
+        return CountedPage(self, self.validate_number(number))
+
+    def fetch(self, number):
+        """Объекты страницы и её номер, исправленный, если после COUNT(*)
+        страница оказалась за концом."""
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        expected = max(min(self.per_page + 1, self.count - bottom), 0)
+        if len(rows) != expected and self._recount():
+            number = min(number, self.num_pages)
+            return self.fetch(number)
+        return rows[:self.per_page], number
+
+
+def elided_page_range(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, пропуски — `ELLIPSIS`.
+
+    Как `Paginator.get_elided_page_range` из Django 3.2: на ленте из
+    тысяч страниц навигация остаётся в десяток ссылок.
+    """
+    if num_pages <= (on_each_side + on_ends) * 2:
+        yield from range(1, num_pages + 1)
+        return
+    if number > 1 + on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+class CursorPage(Page):
+    """Страница, соседние страницы которой задаются курсорами.
+
+    Запрос выполняется лениво, при первом обращении к объектам или
+    курсорам: если страница целиком взята из кеша фрагментов шаблона,
+    в базу никто не ходит.
+    """
+    cursor_based = True
+
+    def __init__(self, paginator, after=None, before=None):
+        self.number = None
+        self.paginator = paginator
+        self.after = after
+        self.before = before
+
+    def __repr__(self):
+        return "<CursorPage of %s objects>" % len(self.object_list)
+
+    @cached_property
+    def _window(self):
+        return self.paginator.fetch(self.after, self.before)
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    @property
+    def next_cursor(self):
+        return self._window[1]
+
+    @property
+    def previous_cursor(self):
+        return self._window[2]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу сортировки (keyset) вместо OFFSET.
+
+    Каждая страница выбирается условием «строго после/до курсора»,
+    поэтому глубокие страницы стоят столько же, сколько первая,
+    а COUNT(*) не выполняется вовсе.
+    """
+
+    def __init__(self, object_list, per_page, ordering=DEFAULT_ORDERING):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = ordering
+        self.fields = [name.lstrip("-") for name in ordering]
+        self.descending = ordering[0].startswith("-")
+        annotations = object_list.query.annotations
+        self.model_fields = [
+            annotations[name].output_field if name in annotations
+            else object_list.model._meta.get_field(name)
+            for name in self.fields
+        ]
+
+    def _seek(self, values, forward):
+        lookup = "lt" if self.descending == forward else "gt"
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            equal = dict(zip(self.fields[:i], values[:i]))
+            equal[f"{name}__{lookup}"] = values[i]
+            condition |= Q(**equal)
+        return condition
+
+    def _cursor_for(self, obj):
+        return encode_cursor([getattr(obj, name) for name in self.fields])
+
+    def get_cursor_page(self, after=None, before=None):
+        """Возвращает страницу после курсора `after` или до `before`.
+
+        Без курсоров (или с испорченным курсором) возвращается первая
+        страница.
+        """
+        return CursorPage(self, after, before)
+
+    def fetch(self, after=None, before=None):
+        """Выбирает страницу: (объекты, курсор вперёд, курсор назад)."""
+        after_values = decode_cursor(after, self.model_fields)
+        before_values = decode_cursor(before, self.model_fields)
+        queryset = self.object_list
+        forward = before_values is None
+        if not forward:
+            queryset = queryset.filter(self._seek(before_values, False))
+            queryset = queryset.reverse()
+        elif after_values is not None:
+            queryset = queryset.filter(self._seek(after_values, True))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, after_values is not None
+        else:
+            has_next, has_previous = True, has_more
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._cursor_for(rows[-1])
+        if rows and has_previous:
+            previous_cursor = self._cursor_for(rows[0])
+        return rows, next_cursor, previous_cursor
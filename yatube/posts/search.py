@@ -0,0 +1,175 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс `posts_post_fts` создаёт миграция 0020 и поддерживают триггеры
+на `posts_post`, поэтому он не расходится с постами ни при сохранении
+через ORM, ни при массовых `bulk_create`/`update`. Пересобрать индекс
+целиком можно командой `manage.py rebuild_search_index`.
+
+SQLite выполняет многие изменения схемы (например, AddField) через
+пересоздание таблицы, и триггеры при этом пропадают. Поэтому после
+каждого `migrate` они создаются заново (`restore_triggers`).
+"""
+import re
+
+from django.db import connection, connections, models
+
+from .models import Post
+from .paginator import CursorPage, decode_cursor, encode_cursor
+
+TABLE = "posts_post_fts"
+MAX_TERMS = 8
+# Типы значений курсора выдачи: оценка bm25 и id поста.
+CURSOR_FIELDS = (models.FloatField(), Post._meta.get_field("id"))
+
+WORD = re.compile(r"\w+")
+
+TRIGGERS = {
+    "posts_post_fts_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+        END
+    """,
+    "posts_post_fts_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+    """,
+    "posts_post_fts_update": f"""
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+        AFTER UPDATE OF text ON posts_post
+        WHEN old.text IS NOT new.text BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+        END
+    """,
+}
+
+
+def make_query(text):
+    """Превращает ввод пользователя в запрос FTS5.
+
+    Каждое слово берётся в кавычки, чтобы операторы FTS5 (AND, NEAR, *)
+    из ввода не разбирались; последнее слово ищется по префиксу.
+    Без слов возвращает пустую строку.
+    """
+    terms = WORD.findall(text or "")[:MAX_TERMS]
+    if not terms:
+        return ""
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += "*"
+    return " ".join(phrases)
+
+
+def filter_posts(queryset, query):
+    """Оставляет в queryset постов только подходящие под запрос FTS5."""
+    # RawSQL в `id__in` Django оборачивает в лишние скобки, и SQLite
+    # видит скалярный подзапрос с одной строкой, поэтому условие через extra.
+    return queryset.extra(
+        where=[f"posts_post.id IN"
+               f" (SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)"],
+        params=[query],
+    )
+
+
+class SearchPaginator:
+    """Постраничная выдача результатов поиска по релевантности.
+
+    Порядок — по (bm25, id), курсор хранит эту пару, как курсоры лент
+    хранят (pub_date, id). Страницы отдаются как `CursorPage`, так что
+    шаблон навигации общий с лентами.
+    """
+
+    def __init__(self, query, per_page):
+        self.query = query
+        self.per_page = per_page
+
+    def get_cursor_page(self, after=None, before=None):
+        return CursorPage(self, after, before)
+
+    def _window(self, seek, forward):
+        direction = "" if forward else " DESC"
+        sql = (
+            "SELECT score, id FROM ("
+            f" SELECT rowid AS id, bm25({TABLE}) AS score FROM {TABLE}"
+            f" WHERE {TABLE} MATCH %s)"
+        )
+        params = [self.query]
+        if seek is not None:
+            lookup = ">" if forward else "<"
+            sql += (f" WHERE score {lookup} %s"
+                    f" OR (score = %s AND id {lookup} %s)")
+            params += [seek[0], seek[0], seek[1]]
+        sql += f" ORDER BY score{direction}, id{direction} LIMIT %s"
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def fetch(self, after=None, before=None):
+        """Выбирает страницу: (посты, курсор вперёд, курсор назад)."""
+        after_values = decode_cursor(after, CURSOR_FIELDS)
+        before_values = decode_cursor(before, CURSOR_FIELDS)
+        forward = before_values is None
+        hits = self._window(after_values if forward else before_values,
+                            forward)
+        has_more = len(hits) > self.per_page
+        hits = hits[:self.per_page]
+        if not forward:
+            hits.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, after_values is not None
+        else:
+            has_next, has_previous = True, has_more
+        next_cursor = previous_cursor = None
+        if hits and has_next:
+            next_cursor = encode_cursor(hits[-1])
+        if hits and has_previous:
+            previous_cursor = encode_cursor(hits[0])
+
+        posts = Post.objects.select_related("author", "group").in_bulk(
+            [post_id for _, post_id in hits])
+        rows = [posts[post_id] for _, post_id in hits if post_id in posts]
+        return rows, next_cursor, previous_cursor
+
+
+def rebuild():
+    """Пересобирает индекс по всем постам и сливает его сегменты."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def drop_triggers():
+    """Отключает обновление индекса, например на время массового импорта."""
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def install_triggers(using="default"):
+    """Создаёт недостающие триггеры. Возвращает их имена."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {name for name, in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+    return missing
+
+
+def restore_triggers(sender, using="default", **kwargs):
+    """Обработчик post_migrate: возвращает триггеры индекса, если миграция
+    пересоздала таблицу постов, и пересобирает индекс."""
+    db = connections[using]
+    if db.vendor != "sqlite" or TABLE not in db.introspection.table_names():
+        return
+    if install_triggers(using):
+        with db.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
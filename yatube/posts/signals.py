@@ -0,0 +1,63 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import follow_graph
+from .caching import GLOBAL_FEED, bump, post_feeds
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние группу и автора, чтобы сбросить и их ленты."""
+    instance._old_group_id = instance._old_author_id = None
+    if instance.pk and not raw:
+        instance._old_group_id, instance._old_author_id = Post.objects.filter(
+            pk=instance.pk,
+        ).values_list("group_id", "author_id").first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_feeds(sender, instance, **kwargs):
+    old_group_id = getattr(instance, "_old_group_id", None)
+    feeds = post_feeds(instance, old_group_id)
+    old_author_id = getattr(instance, "_old_author_id", None)
+    if old_author_id is not None:
+        feeds.add(f"profile:{old_author_id}")
+    bump(*feeds)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_feeds(sender, instance, **kwargs):
+    # Число комментариев выводится в карточках всех лент поста.
+    if Comment.post.is_cached(instance):
+        post = instance.post
+    else:
+        post = Post.objects.filter(pk=instance.post_id).only(
+            "author_id", "group_id").first()
+    if post is None:
+        bump(f"post:{instance.post_id}")
+    else:
+        bump(*post_feeds(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_feeds(sender, instance, **kwargs):
+    # Название и адрес группы выводятся в карточках всех лент.
+    bump(GLOBAL_FEED)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_graph(sender, instance, **kwargs):
+    follow_graph.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """Счётчики нового пользователя заводятся сразу, а не пересчётом
+    при первом просмотре профиля."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user_id=instance.pk)
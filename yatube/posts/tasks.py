@@ -0,0 +1,56 @@
+"""Фоновые задачи в локальном пуле процессов.
+
+Пул создаётся лениво, по одному на воркер, и запускает процессы методом
+spawn: дочерний процесс поднимает Django заново и не наследует открытых
+соединений с базой. При `BACKGROUND_WORKERS = 0` задачи выполняются сразу
+в текущем процессе.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def init_worker():
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        )
+    return _executor
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Фоновая задача завершилась ошибкой", exc_info=error)
+
+
+def run(func, *args):
+    """Запускает `func(*args)` в пуле. Функция должна импортироваться
+    по имени модуля, аргументы — сериализоваться pickle."""
+    if not settings.BACKGROUND_WORKERS:
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("Фоновая задача завершилась ошибкой")
+        return
+    _get_executor().submit(func, *args).add_done_callback(_log_failure)
+
+
+def run_on_commit(func, *args):
+    """Запускает задачу, только когда текущая транзакция зафиксирована."""
+    transaction.on_commit(lambda: run(func, *args))
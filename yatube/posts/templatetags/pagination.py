@@ -0,0 +1,21 @@
+from django import template
+
+from ..paginator import ELLIPSIS, elided_page_range
+
+register = template.Library()
+
+
+@register.inclusion_tag("includes/paginator.html", takes_context=True)
+def paginator(context, page_obj):
+    """`{% paginator page_obj %}` — навигация по ленте: курсоры или окно
+    номеров вокруг текущей страницы с первой и последней по краям."""
+    page_range = ()
+    if page_obj and not getattr(page_obj, "cursor_based", False):
+        page_range = elided_page_range(
+            page_obj.number, page_obj.paginator.num_pages)
+    return {
+        "page_obj": page_obj,
+        "page_range": page_range,
+        "ellipsis": ELLIPSIS,
+        "page_query": context.get("page_query", ""),
+    }
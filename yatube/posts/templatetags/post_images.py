@@ -0,0 +1,22 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, preset):
+    """`{% ready_thumbnail post.image "card" as im %}` — готовая миниатюра
+    или None, пока фоновая задача её не создала."""
+    if not image:
+        return None
+    return thumbnails.ready_thumbnail(image, preset)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, preset):
+    """`{% prefetch_thumbnails page_obj "card" %}` перед циклом по постам:
+    миниатюры всей страницы ищутся одним запросом, а не по одному."""
+    thumbnails.prefetch([post.image for post in posts or ()], preset)
+    return ""
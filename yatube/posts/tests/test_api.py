@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from ..models import Group, Post
+from ..api import NUMBER_POSTS
+
+User = get_user_model()
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Название группы",
+            description="Описание",
+            slug="test-slug",
+        )
+        cls.author = User.objects.create_user(username="author")
+        Post.objects.bulk_create(
+            Post(text=f"Текст {i}", author=cls.author, group=cls.group)
+            for i in range(NUMBER_POSTS + 5)
+        )
+        cls.urls = (
+            reverse("posts:api_index"),
+            reverse("posts:api_group_list",
+                    kwargs={"slug": cls.group.slug}),
+            reverse("posts:api_profile",
+                    kwargs={"username": cls.author.username}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_are_paged_by_cursor(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(len(first["posts"]), NUMBER_POSTS)
+                self.assertEqual(first["posts"][0]["author"], "author")
+                self.assertEqual(first["posts"][0]["group"], "test-slug")
+                second = self.client.get(url, {"after": first["next"]})
+                self.assertEqual(len(second.json()["posts"]), 5)
+                self.assertIsNone(second.json()["next"])
+
+    def test_not_modified_without_fetching_posts(self):
+        # Последний пост ленты, а для групп и профилей ещё их поиск.
+        for url, queries in zip(self.urls, (1, 2, 2)):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response["ETag"]
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_last_modified_is_newest_post(self):
+        newest = Post.objects.latest("pub_date")
+        response = self.client.get(self.urls[0])
+        self.assertEqual(response["Last-Modified"],
+                         http_date(newest.pub_date.timestamp()))
+        response = self.client.get(
+            self.urls[0], HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_give_new_etag(self):
+        etags = [self.client.get(url)["ETag"] for url in self.urls]
+        Post.objects.create(text="Новый", author=self.author,
+                            group=self.group)
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["posts"][0]["text"], "Новый")
+
+    def test_pages_have_own_etags(self):
+        url = self.urls[0]
+        first = self.client.get(url)
+        second = self.client.get(url, {"after": first.json()["next"]})
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_unknown_feed(self):
+        response = self.client.get(
+            reverse("posts:api_group_list", kwargs={"slug": "nope"}))
+        self.assertEqual(response.status_code, 404)
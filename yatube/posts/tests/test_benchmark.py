@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Comment, FeedItem, Follow, Post, User, UserStats
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command("seed_benchmark", "--scale", "0.0002",
+                     stdout=StringIO())
+
+    def test_seed_follows_power_law(self):
+        sizes = benchmark.sizes(0.0002)
+        self.assertEqual(User.objects.count(), sizes["users"])
+        self.assertEqual(Post.objects.count(), sizes["posts"])
+        top = Post.objects.filter(author__username="user0").count()
+        last = Post.objects.filter(author__username="user1").count()
+        self.assertGreater(top, last)
+        hot = Post.objects.order_by("-comments_count").first()
+        self.assertEqual(hot.comments_count, hot.comments.count())
+        self.assertGreaterEqual(
+            hot.comments_count, sizes["hot_thread_comments"])
+        viewer = User.objects.get(username=benchmark.VIEWER)
+        self.assertTrue(Follow.objects.filter(user=viewer).exists())
+        self.assertTrue(viewer.feed.exists())
+        self.assertEqual(Comment.objects.count(),
+                         sizes["comments"] + sizes["hot_thread_comments"])
+
+    def test_seed_refuses_non_empty_database(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_benchmark", stdout=StringIO())
+
+    def test_run_reports_every_url(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "bench.json")
+        dataset = (Follow.objects.count(), FeedItem.objects.count(),
+                   UserStats.objects.order_by("pk").values_list(
+                       "followers_count", flat=True).first())
+        call_command("run_benchmark", "--repeat", "2", "--output", path,
+                     stderr=StringIO())
+        # Прогон только читает: повторный мерит те же данные.
+        self.assertEqual(
+            (Follow.objects.count(), FeedItem.objects.count(),
+             UserStats.objects.order_by("pk").values_list(
+                 "followers_count", flat=True).first()),
+            dataset,
+        )
+        with open(path) as file:
+            report = json.load(file)
+        self.assertEqual(report["dataset"]["users"], User.objects.count())
+        urls = report["urls"]
+        for name in benchmark.WRITE_URLS:
+            self.assertFalse(
+                any(url.startswith(name) for url in urls), name)
+        for name in ("posts:index", "posts:index[page-100]",
+                     "posts:post_detail[hot]", "posts:search",
+                     "users:login", "about:tech"):
+            self.assertIn(name, urls)
+        index = urls["posts:index"]
+        self.assertEqual(index["status"], [200])
+        self.assertLessEqual(index["p50_ms"], index["p99_ms"])
+        self.assertIsInstance(index["queries"], int)
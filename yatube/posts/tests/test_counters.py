@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import FeedItem, Follow, Group, Post, UserStats
+from .. import counters, feed
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Название группы",
+            description="Описание",
+            slug="test-slug",
+        )
+        cls.group_2 = Group.objects.create(
+            title="Название группы",
+            description="Описание",
+            slug="test-slug_2",
+        )
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+
+    def setUp(self):
+        # Граф подписок кешируется по id, а id после отката переиспользуются.
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_views_keep_counters_in_sync(self):
+        """Создание поста, перенос в другую группу, комментарий
+        и подписка обновляют счётчики без пересчёта."""
+        self.author_client.post(
+            reverse("posts:post_create"),
+            data={"text": "Текст", "group": self.group.pk},
+        )
+        post = Post.objects.get(text="Текст")
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(counters.stats_for(self.author).posts_count, 1)
+
+        self.author_client.post(
+            reverse("posts:post_edit", kwargs={"post_id": post.pk}),
+            data={"text": "Текст", "group": self.group_2.pk},
+        )
+        self.group.refresh_from_db()
+        self.group_2.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group_2.posts_count, 1)
+
+        self.reader_client.post(
+            reverse("posts:add_comment", kwargs={"post_id": post.pk}),
+            data={"text": "Комментарий"},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        self.reader_client.get(
+            reverse("posts:profile_follow",
+                    kwargs={"username": self.author.username}))
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1)
+        self.reader_client.get(
+            reverse("posts:profile_unfollow",
+                    kwargs={"username": self.author.username}))
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_admin_reassigns_author(self):
+        """Смена автора в админке переносит счётчики и ленты подписчиков."""
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass")
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="Текст", author=self.author)
+        counters.post_added(post)
+        feed.fan_out(post)
+        self.reader_client.get(
+            reverse("posts:profile", args=[self.author.username]))
+        client = Client()
+        client.force_login(admin)
+
+        client.post(
+            reverse("admin:posts_post_change", args=[post.pk]),
+            data={"text": "Текст", "author": self.reader.pk, "group": ""},
+        )
+
+        self.assertEqual(Post.objects.get(pk=post.pk).author, self.reader)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).posts_count, 1)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        response = self.reader_client.get(
+            reverse("posts:profile", args=[self.author.username]))
+        self.assertNotContains(response, "Текст</p>")
+        self.assertEqual(len(response.context["page_obj"]), 0)
+
+    def test_recount_repairs_drift(self):
+        Post.objects.create(text="Текст", author=self.author, group=self.group)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=42)
+        UserStats.objects.filter(user=self.author).delete()
+
+        call_command("recount", stdout=StringIO())
+
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Название группы",
+            description="Описание",
+            slug="test-slug",
+        )
+        cls.user = User.objects.create_user(username="author")
+        cls.other = User.objects.create_user(username="other")
+        cls.post = Post.objects.create(
+            text="С картинкой",
+            author=cls.user,
+            group=cls.group,
+            image=SimpleUploadedFile("small.gif", SMALL_GIF, "image/gif"),
+        )
+        Post.objects.bulk_create(
+            Post(text=f"Пост {i}", author=cls.user) for i in range(5))
+        Post.objects.create(text="Чужой", author=cls.other)
+        Comment.objects.create(post=cls.post, author=cls.user, text="Ок")
+        Follow.objects.create(user=cls.user, author=cls.other)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_ndjson(self):
+        response = self.client.get(reverse("posts:export"))
+        self.assertTrue(response.streaming)
+        self.assertIn("author.ndjson", response["Content-Disposition"])
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        kinds = [row["type"] for row in rows]
+        self.assertEqual(kinds, ["post"] * 6 + ["comment", "follow"])
+        self.assertEqual(rows[0]["group_slug"], "test-slug")
+        self.assertEqual(rows[-1]["username"], "other")
+
+    def test_zip_streams_images(self):
+        response = self.client.get(reverse("posts:export"), {"format": "zip"})
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(
+            BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ["comments.ndjson", "follows.ndjson", "images/small.gif",
+             "posts.ndjson"],
+        )
+        self.assertEqual(archive.read("images/small.gif"), SMALL_GIF)
+        posts = archive.read("posts.ndjson").decode().splitlines()
+        self.assertEqual(len(posts), 6)
+
+    def test_export_requires_login(self):
+        response = Client().get(reverse("posts:export"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command(self):
+        path = os.path.join(TEMP_MEDIA_ROOT, "export.zip")
+        call_command("export_user", "author", "--format", "zip",
+                     "--output", path, stdout=StringIO())
+        with zipfile.ZipFile(path) as archive:
+            self.assertIn("images/small.gif", archive.namelist())
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters, follow_graph
+from ..models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username="reader")
+        cls.authors = [
+            User.objects.create_user(username=f"author{i}") for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_follow_checks_come_from_cache(self):
+        Follow.objects.create(user=self.reader, author=self.authors[2])
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(follow_graph.following(self.reader.pk)),
+                [self.authors[0].pk, self.authors[2].pk],
+            )
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                follow_graph.is_following(self.reader.pk, self.authors[2].pk))
+            self.assertFalse(
+                follow_graph.is_following(self.reader.pk, self.authors[1].pk))
+            self.assertEqual(follow_graph.following_count(self.reader.pk), 2)
+            self.assertFalse(follow_graph.is_following(None, self.reader.pk))
+
+    def test_follow_and_unfollow_update_graph(self):
+        author = self.authors[1]
+        self.assertFalse(follow_graph.is_following(self.reader.pk, author.pk))
+        self.client.get(
+            reverse("posts:profile_follow", args=[author.username]))
+        self.assertTrue(follow_graph.is_following(self.reader.pk, author.pk))
+        response = self.client.get(
+            reverse("posts:profile", args=[author.username]))
+        self.assertTrue(response.context["following"])
+        self.client.get(
+            reverse("posts:profile_unfollow", args=[author.username]))
+        self.assertFalse(follow_graph.is_following(self.reader.pk, author.pk))
+
+    def test_follow_with_stale_graph(self):
+        """Граф в кеше не знает о подписке: повторная подписка не падает
+        и не пересчитывает счётчики второй раз."""
+        author = self.authors[1]
+        follow_graph.following(self.reader.pk)
+        # bulk_create не шлёт сигналов, и кеш остаётся устаревшим.
+        Follow.objects.bulk_create([Follow(user=self.reader, author=author)])
+        response = self.client.get(
+            reverse("posts:profile_follow", args=[author.username]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader, author=author).count(), 1)
+        self.assertEqual(counters.stats_for(author).followers_count, 0)
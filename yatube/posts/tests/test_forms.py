@@ -4,10 +4,16 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from io import BytesIO
 import shutil
+import struct
 import tempfile
+import zlib
+
+from PIL import Image
 
 from ..models import Post, Group
+from .. import thumbnails
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -159,3 +165,78 @@ class PostsCreateFormTests(TestCase):
         )
         count_comments_after = post.comments.count()
         self.assertEqual(count_comments_before, count_comments_after)
+
+
+def png_header(width, height):
+    """Начало PNG-файла с заданными размерами: картинку целиком
+    Pillow при этом раскодировать не нужно."""
+    def chunk(kind, data):
+        body = kind + data
+        return (
+            struct.pack(">I", len(data)) + body
+            + struct.pack(">I", zlib.crc32(body))
+        )
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(b"\x00" * 1024)) + chunk(b"IEND", b"")
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadLimitsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="uploader")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, content):
+        return self.client.post(
+            reverse("posts:post_create"),
+            data={
+                "text": "Текст",
+                "image": SimpleUploadedFile(
+                    "image.png", content, content_type="image/png"),
+            },
+        )
+
+    def test_decompression_bomb_rejected_by_header(self):
+        response = self.upload(png_header(20000, 20000))
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+        errors = response.context["form"].errors["image"]
+        self.assertIn("слишком большая", errors[0])
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=100)
+    def test_file_over_byte_limit_rejected(self):
+        response = self.upload(png_header(10, 10) + b"\x00" * 1000)
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+        errors = response.context["form"].errors["image"]
+        self.assertIn("Файл слишком большой", errors[0])
+
+    def test_small_image_accepted(self):
+        image = BytesIO()
+        Image.new("RGB", (10, 10)).save(image, "PNG")
+        self.upload(image.getvalue())
+        self.assertTrue(Post.objects.filter(author=self.user).exists())
+
+    @override_settings(MAX_IMAGE_SIDE=50)
+    def test_oversized_original_is_capped_in_background(self):
+        image = BytesIO()
+        Image.new("RGB", (200, 100)).save(image, "PNG")
+        post = Post.objects.create(
+            text="Текст",
+            author=self.user,
+            image=SimpleUploadedFile("big.png", image.getvalue()),
+        )
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        with Image.open(post.image.path) as capped:
+            self.assertEqual(capped.size, (50, 25))
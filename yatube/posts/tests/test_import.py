@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import caching, feed
+from ..models import FeedItem, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=os.path.join(TEMP_DIR, "media"))
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Название группы",
+            description="Описание",
+            slug="test-slug",
+        )
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(TEMP_DIR, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def import_posts(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_posts", path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_jsonl_import(self):
+        rows = [
+            {"text": f"Импорт {i}", "author": "author", "group": "test-slug",
+             "pub_date": f"2020-01-{i + 1:02d}T10:00:00"}
+            for i in range(5)
+        ]
+        rows.append({"text": "Чужой", "author": "nobody"})
+        path = self.write(
+            "posts.jsonl", "\n".join(json.dumps(row) for row in rows))
+
+        out, err = self.import_posts(path, "--batch-size", "2")
+
+        self.assertIn("Импортировано постов: 5", out)
+        self.assertIn("нет автора", err)
+        post = Post.objects.get(text="Импорт 0")
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertTrue(Post._meta.get_field("pub_date").auto_now_add)
+        self.assertEqual(post.group, self.group)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 5)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 5)
+        self.assertEqual(FeedItem.objects.filter(user=self.reader).count(), 5)
+        response = self.client.get(reverse("posts:search"), {"q": "импорт"})
+        self.assertEqual(len(response.context["page_obj"]), 5)
+
+    def test_default_batch_size(self):
+        """Пачка по умолчанию больше лимита SQLite на строки в INSERT."""
+        path = self.write("many.jsonl", "\n".join(
+            json.dumps({"text": f"Пост {i}", "author": "author"})
+            for i in range(1200)
+        ))
+
+        out, _ = self.import_posts(path)
+
+        self.assertIn("Импортировано постов: 1200", out)
+        self.assertEqual(Post.objects.count(), 1200)
+
+    def test_bad_rows_are_skipped(self):
+        path = self.write("bad.jsonl", "\n".join([
+            "{не json",
+            json.dumps(["author"]),
+            json.dumps({"text": "Число", "author": "author",
+                        "pub_date": 20210101}),
+            json.dumps({"text": "Хороший", "author": "author"}),
+        ]))
+
+        out, err = self.import_posts(path)
+
+        self.assertIn("Импортировано постов: 1", out)
+        self.assertIn("Пропущено записей: 3", out)
+        for reason in ("некорректный JSON", "запись не объект",
+                       "некорректная дата"):
+            self.assertIn(reason, err)
+
+    def test_failed_batch_keeps_feeds_consistent(self):
+        """После ошибки вставленные пачки всё равно разложены по лентам,
+        а картинки невставленной пачки удалены."""
+        images = os.path.join(TEMP_DIR, "images")
+        os.makedirs(images, exist_ok=True)
+        with open(os.path.join(images, "dog.gif"), "wb") as file:
+            file.write(b"GIF89a")
+        path = self.write("fail.jsonl", "\n".join([
+            json.dumps({"text": "Первая пачка", "author": "author"}),
+            json.dumps({"text": "Вторая пачка", "author": "author",
+                        "image": "dog.gif"}),
+        ]))
+        real_insert = Post.objects._insert
+        calls = []
+
+        def insert(*args, **kwargs):
+            calls.append(1)
+            if len(calls) > 1:
+                raise RuntimeError("сбой базы")
+            return real_insert(*args, **kwargs)
+
+        generation = caching.generation(caching.GLOBAL_FEED)
+        with mock.patch.object(Post.objects, "_insert", insert):
+            with self.assertRaises(RuntimeError):
+                self.import_posts(path, "--batch-size", "1",
+                                  "--images", images)
+
+        post = Post.objects.get()
+        self.assertEqual(post.text, "Первая пачка")
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+        self.assertNotEqual(
+            caching.generation(caching.GLOBAL_FEED), generation)
+        self.assertNotIn(
+            "dog.gif", os.listdir(os.path.join(settings.MEDIA_ROOT, "posts")))
+
+    def test_triggers_are_restored(self):
+        path = self.write("one.jsonl", json.dumps(
+            {"text": "Первый", "author": "author"}))
+        self.import_posts(path)
+        Post.objects.create(text="Созданный после импорта", author=self.author)
+        response = Client().get(reverse("posts:search"), {"q": "созданный"})
+        self.assertEqual(len(response.context["page_obj"]), 1)
+
+    def test_csv_import_with_images(self):
+        images = os.path.join(TEMP_DIR, "images")
+        os.makedirs(images, exist_ok=True)
+        with open(os.path.join(images, "cat.gif"), "wb") as file:
+            file.write(b"GIF89a")
+        path = self.write(
+            "posts.csv",
+            "text,author,group,image\n"
+            "С картинкой,author,,cat.gif\n"
+            "Без файла,author,,missing.gif\n",
+        )
+
+        out, err = self.import_posts(path, "--images", images)
+
+        self.assertIn("Импортировано постов: 1", out)
+        self.assertIn("нет файла картинки", err)
+        post = Post.objects.get(text="С картинкой")
+        self.assertEqual(post.image.name, "posts/cat.gif")
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_fan_out_skips_posts_already_in_feeds(self):
+        """Посты, созданные через сайт во время импорта, уже разложены."""
+        post = Post.objects.create(text="С сайта", author=self.author)
+        feed.fan_out(post)
+        feed.fan_out_after(post.pk - 1)
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.reader, post=post).count(), 1)
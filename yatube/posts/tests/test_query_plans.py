@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from .. import counters, feed
+
+User = get_user_model()
+
+
+class FeedQueryPlanTest(TestCase):
+    """Ни одна лента не сортирует строки во временном B-дереве:
+    порядок выдачи берётся прямо из составных индексов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Название группы",
+            description="Описание",
+            slug="test-slug",
+        )
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            post = Post.objects.create(
+                text=f"Текст {i}",
+                author=cls.author,
+                group=cls.group,
+            )
+            feed.fan_out(post)
+        cls.post = post
+        Comment.objects.create(post=post, author=cls.reader, text="Ок")
+        # Посты созданы в обход счётчиков, а `?page=` им доверяет.
+        counters.recount()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return " ".join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_feeds_do_not_sort_in_temp_btree(self):
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:trending"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile",
+                    kwargs={"username": self.author.username}),
+            reverse("posts:follow_index"),
+            reverse("posts:post_detail", kwargs={"post_id": self.post.pk}),
+            reverse("posts:api_index"),
+            reverse("posts:api_group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:api_profile",
+                    kwargs={"username": self.author.username}),
+        )
+        for url in urls:
+            for query in ("", "?page=2"):
+                with self.subTest(url=url + query):
+                    with CaptureQueriesContext(connection) as queries:
+                        self.client.get(url + query)
+                    for captured in queries.captured_queries:
+                        sql = captured["sql"]
+                        if not sql.startswith("SELECT"):
+                            continue
+                        self.assertNotIn(
+                            "TEMP B-TREE", self.explain(sql), sql)
@@ -0,0 +1,122 @@
+from io import StringIO
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import recommendations
+from ..models import Follow, Recommendation
+
+User = get_user_model()
+
+
+class RecommendationsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ("reader", "b", "c", "d", "e", "f", "other")
+        }
+        for user, author in (
+            ("reader", "b"), ("reader", "c"),
+            ("b", "d"), ("c", "d"), ("c", "e"),
+            ("other", "b"), ("other", "f"),
+        ):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author])
+
+    def setUp(self):
+        cache.clear()
+
+    def recommended(self, rows, name):
+        user_id = self.users[name].pk
+        names = {user.pk: name for name, user in self.users.items()}
+        return [
+            (names[author_id], score)
+            for row_user, author_id, score in rows if row_user == user_id
+        ]
+
+    def test_friends_of_friends_and_co_follows(self):
+        rows = [row for _, batch in recommendations._compute_python()
+                for row in batch]
+        self.assertEqual(
+            self.recommended(rows, "reader"),
+            [("d", 2.0), ("e", 1.0), ("f", 0.5)],
+        )
+
+    @skipIf(recommendations.sparse is None, "нет SciPy")
+    def test_sparse_matches_python(self):
+        python = [row for _, batch in recommendations._compute_python()
+                  for row in batch]
+        # Подписки одного читателя попадают в разные порции.
+        with mock.patch.object(recommendations, "CHUNK_SIZE", 3):
+            scipy = [row for _, batch in recommendations._compute_sparse()
+                     for row in batch]
+            follows = recommendations._follows_matrix()
+        self.assertEqual(scipy, python)
+        self.assertEqual(follows.indices.dtype, recommendations.np.int32)
+        self.assertEqual(follows.nnz, Follow.objects.count())
+        # Подписки и читатели, появившиеся после подсчёта, тоже попадают
+        # в матрицу.
+        with mock.patch.object(recommendations, "_scalar", return_value=0):
+            grown = recommendations._follows_matrix()
+        self.assertEqual((grown != follows).nnz, 0)
+
+    def test_command_and_pages(self):
+        call_command("recommend", stdout=StringIO())
+        reader = self.users["reader"]
+        self.assertEqual(
+            list(Recommendation.objects.filter(user=reader).order_by(
+                "-score").values_list("author__username", flat=True)),
+            ["d", "e", "f"],
+        )
+        client = Client()
+        client.force_login(reader)
+        response = client.get(reverse("posts:follow_index"))
+        self.assertEqual(
+            [author.username for author in response.context[
+                "recommendations"]],
+            ["d", "e", "f"],
+        )
+        client.get(reverse("posts:profile_follow", args=["d"]))
+        response = client.get(reverse("posts:profile", args=["b"]))
+        self.assertEqual(
+            [author.username for author in response.context[
+                "recommendations"]],
+            ["e", "f"],
+        )
+        self.assertContains(response, "Рекомендуем подписаться")
+
+    def test_followed_authors_do_not_shrink_widget(self):
+        reader = self.users["reader"]
+        Recommendation.objects.bulk_create([
+            Recommendation(user=reader, author=self.users[name], score=score)
+            for name, score in (("b", 5), ("c", 4), ("d", 3), ("e", 2),
+                                ("f", 1))
+        ])
+        self.assertEqual(
+            [author.username
+             for author in recommendations.for_user(reader, limit=2)],
+            ["d", "e"],
+        )
+
+    def test_profile_etag_follows_viewer_subscriptions(self):
+        call_command("recommend", stdout=StringIO())
+        client = Client()
+        client.force_login(self.users["reader"])
+        url = reverse("posts:profile", args=["other"])
+        etag = client.get(url)["ETag"]
+        # Подписка на другого автора меняет блок рекомендаций на этой
+        # странице, хотя счётчики её владельца те же.
+        client.get(reverse("posts:profile_follow", args=["d"]))
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [author.username for author in response.context[
+                "recommendations"]],
+            ["e", "f"],
+        )
@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from .. import search
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass")
+        cls.strong = Post.objects.create(
+            text="Котики котики котики", author=cls.author)
+        cls.weak = Post.objects.create(
+            text="Котики и длинный рассказ про собак и погоду на даче",
+            author=cls.author,
+        )
+        cls.other = Post.objects.create(
+            text="Совсем про другое", author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, q, **params):
+        response = self.client.get(
+            reverse("posts:search"), {"q": q, **params})
+        return response, list(response.context["page_obj"])
+
+    def test_results_are_ranked(self):
+        """Пост, где слово встречается чаще, выше в выдаче."""
+        _, posts = self.found("котики")
+        self.assertEqual(posts, [self.strong, self.weak])
+
+    def test_prefix_and_case(self):
+        _, posts = self.found("КОТ")
+        self.assertEqual(len(posts), 2)
+
+    def test_operators_in_input_are_not_parsed(self):
+        for q in ('"котики', "котики AND", "NEAR(", "*", "котики) OR ("):
+            with self.subTest(q=q):
+                response = self.client.get(reverse("posts:search"), {"q": q})
+                self.assertEqual(response.status_code, 200)
+
+    def test_index_follows_changes(self):
+        """Триггеры обновляют индекс при правке и удалении поста."""
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = "Теперь и тут котики"
+        other.save()
+        _, posts = self.found("котики")
+        self.assertIn(self.other, posts)
+        Post.objects.filter(pk=self.strong.pk).delete()
+        _, posts = self.found("котики")
+        self.assertNotIn(self.strong, posts)
+        _, posts = self.found("другое")
+        self.assertEqual(posts, [])
+
+    def test_cursor_pages(self):
+        Post.objects.bulk_create(
+            Post(text=f"Собака номер {i}", author=self.author)
+            for i in range(25)
+        )
+        seen = []
+        response, posts = self.found("собака")
+        seen += posts
+        while response.context["page_obj"].has_next():
+            cursor = response.context["page_obj"].next_cursor
+            self.assertContains(response, "q=%D1%81%D0%BE%D0%B1")
+            response, posts = self.found("собака", after=cursor)
+            seen += posts
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        page = response.context["page_obj"]
+        _, posts = self.found("собака", before=page.previous_cursor)
+        self.assertEqual(len(posts), 10)
+        self.assertEqual(posts[-1], seen[19])
+
+    def test_admin_search_uses_index(self):
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse("admin:posts_post_changelist"), {"q": "котики"})
+        self.assertEqual(
+            set(response.context["cl"].result_list),
+            {self.strong, self.weak},
+        )
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.TABLE} ({search.TABLE})"
+                " VALUES ('delete-all')")
+        _, posts = self.found("котики")
+        self.assertEqual(posts, [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        _, posts = self.found("котики")
+        self.assertEqual(posts, [self.strong, self.weak])
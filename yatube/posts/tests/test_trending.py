@@ -0,0 +1,90 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import counters, trending
+from ..models import Follow, Post, TrendEpoch
+
+User = get_user_model()
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.popular = User.objects.create_user(username="popular")
+        cls.reader = User.objects.create_user(username="reader")
+        counters.follow_added(
+            Follow.objects.create(user=cls.reader, author=cls.popular))
+        cls.quiet = Post.objects.create(text="Тихий", author=cls.author)
+        cls.hot = Post.objects.create(text="Горячий", author=cls.author)
+        cls.reach = Post.objects.create(text="Охват", author=cls.popular)
+
+    def setUp(self):
+        # Строку эпохи создаёт миграция вместе с тестовой базой; с
+        # сохранённой базой (--keepdb) она может быть сколь угодно старой.
+        TrendEpoch.objects.update_or_create(
+            pk=1, defaults={"started": timezone.now()})
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def comment(self, post):
+        self.client.post(
+            reverse("posts:add_comment", kwargs={"post_id": post.pk}),
+            {"text": "Комментарий"},
+        )
+
+    def scores(self):
+        return dict(Post.objects.values_list("text", "trend_score"))
+
+    def test_comments_raise_score_by_reach(self):
+        self.comment(self.hot)
+        self.comment(self.hot)
+        self.comment(self.reach)
+        scores = self.scores()
+        self.assertEqual(scores["Тихий"], 0)
+        self.assertAlmostEqual(scores["Горячий"], 2, places=3)
+        self.assertAlmostEqual(
+            scores["Охват"], trending.weight(1), places=3)
+
+    def test_older_comments_weigh_less(self):
+        self.comment(self.hot)
+        TrendEpoch.objects.update(
+            started=trending.epoch() - trending.HALF_LIFE)
+        self.comment(self.reach)
+        scores = self.scores()
+        self.assertAlmostEqual(
+            scores["Охват"], 2 * trending.weight(1), places=3)
+
+    def test_renormalize_keeps_order(self):
+        self.comment(self.hot)
+        self.comment(self.hot)
+        self.comment(self.reach)
+        TrendEpoch.objects.update(
+            started=timezone.now() - 2 * trending.HALF_LIFE)
+        call_command("renormalize_trending", stdout=StringIO())
+        scores = self.scores()
+        self.assertAlmostEqual(scores["Горячий"], 0.5, places=3)
+        self.assertAlmostEqual(
+            scores["Охват"], trending.weight(1) / 4, places=3)
+        self.assertLess(
+            timezone.now() - trending.epoch(), datetime.timedelta(minutes=1))
+
+    def test_page_orders_by_score(self):
+        self.comment(self.reach)
+        self.comment(self.hot)
+        self.comment(self.hot)
+        self.comment(self.hot)
+        response = self.client.get(reverse("posts:trending"))
+        self.assertEqual(
+            list(response.context["page_obj"]),
+            [self.hot, self.reach, self.quiet],
+        )
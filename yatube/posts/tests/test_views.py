@@ -3,12 +3,19 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+import base64
+import json
 import shutil
+from unittest import mock
 
-from ..models import Post, Group, Follow
+from ..models import Comment, Post, Group, Follow, FeedItem
 from ..forms import PostForm
-from ..views import NUMBER_POSTS
+from .. import counters, feed, thumbnails
+from ..paginator import CountedPaginator, ELLIPSIS, elided_page_range
+from ..views import NUMBER_COMMENTS, NUMBER_POSTS
 from .test_forms import TEMP_MEDIA_ROOT
 
 User = get_user_model()
@@ -136,6 +143,17 @@ class PostPagesTest(TestCase):
         self.assertEqual(objects.text, self.post.text)
         self.assertEqual(objects.image.name, "posts/" + self.uploaded.name)
 
+    @override_settings(BACKGROUND_WORKERS=0)
+    def test_thumbnails_are_not_rendered_inline(self):
+        """Пока миниатюры нет, вместо неё выводится заглушка."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.pk})
+        response = self.authorized_client.get(url)
+        self.assertContains(response, "aspect-ratio")
+        self.assertNotContains(response, '<img class="card-img')
+        thumbnails.generate(self.post.pk)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, '<img class="card-img')
+
     def test_create_and_edit_post_page_show_correct_context(self):
         responses = (
             self.authorized_client_creator_post.get(
@@ -169,7 +187,8 @@ class PostPagesTest(TestCase):
         )
         response = self.authorized_client.get(reverse("posts:index"))
         content_before = response.content
-        post.delete()
+        # Изменение в обход сигналов не сбрасывает закешированную страницу.
+        Post.objects.filter(pk=post.pk).update(text="Другой текст")
         response = self.authorized_client.get(reverse("posts:index"))
         content_after = response.content
         self.assertEqual(content_before, content_after)
@@ -178,6 +197,26 @@ class PostPagesTest(TestCase):
         content_after = response.content
         self.assertNotEqual(content_before, content_after)
 
+    def test_cache_invalidated_on_delete(self):
+        """Удаление поста сразу убирает его из закешированных лент."""
+        post = Post.objects.create(
+            author=self.user,
+            text="Пост на удаление",
+            group=self.group,
+        )
+        pages = (
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": self.user.username}),
+        )
+        for page in pages:
+            self.assertContains(self.authorized_client.get(page), post.text)
+        post.delete()
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertNotContains(
+                    self.authorized_client.get(page), post.text)
+
     def test_profile_follow_and_unfollow(self):
         """Авторизованный пользователь может подписываться на других
         пользователей и удалять их из подписок."""
@@ -204,6 +243,28 @@ class PostPagesTest(TestCase):
         response = self.authorized_client_2.get(reverse("posts:follow_index"))
         self.assertNotIn(self.post, response.context["page_obj"])
 
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика,
+        а после отписки посты автора из неё исчезают."""
+        self.authorized_client_creator_post.get(
+            reverse("posts:profile_follow",
+                    kwargs={"username": self.user_2.username})
+        )
+        self.authorized_client_2.post(
+            reverse("posts:post_create"), data={"text": "Свежий пост"})
+        new_post = Post.objects.get(text="Свежий пост")
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user, post=new_post).exists())
+        response = self.authorized_client_creator_post.get(
+            reverse("posts:follow_index"))
+        self.assertEqual(response.context["page_obj"][0], new_post)
+
+        self.authorized_client_creator_post.get(
+            reverse("posts:profile_unfollow",
+                    kwargs={"username": self.user_2.username})
+        )
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+
     def test_subscribe_on_yourself(self):
         self.authorized_client.get(
             reverse("posts:profile_follow",
@@ -259,3 +320,305 @@ class PaginatorViewsTest(TestCase):
                     len(response.context["page_obj"]),
                     COUNT_PAGINATOR_POSTS - NUMBER_POSTS
                 )
+
+    def test_cached_pages_do_not_mix(self):
+        """Каждая страница ленты кешируется под своим ключом."""
+        url = reverse("posts:index")
+        first = self.auhtorized_client.get(url).content
+        second = self.auhtorized_client.get(url + "?page=2").content
+        self.assertNotEqual(first, second)
+        self.assertIn("Текст1".encode(), second)
+
+    def test_cursor_pagination(self):
+        """Курсоры `after`/`before` листают ленту без пропусков."""
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        response = self.auhtorized_client.get(url)
+        first_page = response.context["page_obj"]
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        response = self.auhtorized_client.get(
+            url, {"after": first_page.next_cursor})
+        second_page = response.context["page_obj"]
+        self.assertEqual(
+            len(second_page), COUNT_PAGINATOR_POSTS - NUMBER_POSTS)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(
+            set(first_page.object_list) & set(second_page.object_list))
+
+        response = self.auhtorized_client.get(
+            url, {"before": second_page.previous_cursor})
+        self.assertEqual(
+            list(response.context["page_obj"]), list(first_page))
+
+    def test_broken_cursor_returns_first_page(self):
+        url = reverse("posts:profile", kwargs={"username": self.user.username})
+        response = self.auhtorized_client.get(url, {"after": "не-курсор"})
+        self.assertEqual(len(response.context["page_obj"]), NUMBER_POSTS)
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_tampered_cursor_returns_first_page(self):
+        """Токен разбирается, но значения не того типа."""
+        url = reverse("posts:index")
+        for values in (
+            ["2020-01-01T00:00:00+00:00", "abc"],
+            [{"dt": "2020-01-01T00:00:00+00:00"}, [1]],
+            ["garbage", 1],
+            [None, 1],
+            {"dt": "2020-01-01T00:00:00+00:00"},
+        ):
+            token = base64.urlsafe_b64encode(json.dumps(values).encode())
+            with self.subTest(values=values):
+                response = self.auhtorized_client.get(
+                    url, {"after": token.decode()})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context["page_obj"].has_previous())
+                response = self.auhtorized_client.get(
+                    reverse("posts:search"),
+                    {"q": "Текст", "before": token.decode()})
+                self.assertEqual(response.status_code, 200)
+
+    def test_counted_paginator_with_stale_count(self):
+        """Счётчик, разошедшийся с данными, заменяется на COUNT(*)."""
+        posts = Post.objects.order_by("-pub_date", "-id")
+        total = posts.count()
+        for count in (0, total - 1, total + 1, total + NUMBER_POSTS * 3):
+            with self.subTest(count=count):
+                paginator = CountedPaginator(posts, NUMBER_POSTS, count)
+                page = paginator.get_page(2)
+                self.assertEqual(
+                    list(page), list(posts[NUMBER_POSTS:NUMBER_POSTS * 2]))
+                self.assertEqual(paginator.count, total)
+                self.assertFalse(page.has_next())
+
+    def test_counted_paginator_trusts_matching_count(self):
+        posts = Post.objects.order_by("-pub_date", "-id")
+        paginator = CountedPaginator(posts, NUMBER_POSTS, posts.count())
+        with self.assertNumQueries(1):
+            self.assertEqual(len(paginator.get_page(2)),
+                             COUNT_PAGINATOR_POSTS - NUMBER_POSTS)
+
+    def test_elided_page_range(self):
+        self.assertEqual(list(elided_page_range(2, 3)), [1, 2, 3])
+        self.assertEqual(
+            list(elided_page_range(50, 100)),
+            [1, ELLIPSIS, 48, 49, 50, 51, 52, ELLIPSIS, 100],
+        )
+        self.assertEqual(
+            list(elided_page_range(2, 100)),
+            [1, 2, 3, 4, ELLIPSIS, 100],
+        )
+
+    def test_index_page_count_is_cached(self):
+        """COUNT(*) для `?page=` выполняется раз на поколение ленты."""
+        cache.clear()
+        url = reverse("posts:index")
+        self.auhtorized_client.get(url, {"page": 2})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.auhtorized_client.get(url, {"page": 1})
+        self.assertFalse(
+            [q for q in queries.captured_queries if "COUNT(" in q["sql"]])
+        self.assertEqual(response.context["page_obj"].paginator.num_pages, 2)
+        Post.objects.create(text="Новый", author=self.user)
+        response = self.auhtorized_client.get(url, {"page": 1})
+        self.assertEqual(
+            response.context["page_obj"].paginator.count,
+            COUNT_PAGINATOR_POSTS + 1,
+        )
+
+
+class CommentsPagingTest(TestCase):
+    COUNT_COMMENTS = NUMBER_COMMENTS + 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="commentator")
+        cls.post = Post.objects.create(text="Текст", author=cls.user)
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user, text=f"Комментарий {i}")
+            for i in range(cls.COUNT_COMMENTS)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_page_of_comments(self):
+        response = self.client.get(
+            reverse("posts:post_detail", kwargs={"post_id": self.post.pk}))
+        comments = response.context["comments"]
+        self.assertEqual(len(comments), NUMBER_COMMENTS)
+        self.assertEqual(comments[0].text, "Комментарий 0")
+        self.assertContains(
+            response,
+            reverse("posts:comments", kwargs={"post_id": self.post.pk}),
+        )
+
+    def test_comment_authors_are_not_loaded_one_by_one(self):
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.pk})
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertLess(len(queries), NUMBER_COMMENTS)
+
+    def test_continuation_endpoint(self):
+        url = reverse("posts:comments", kwargs={"post_id": self.post.pk})
+        first = self.client.get(url).json()
+        self.assertEqual(len(first["comments"]), NUMBER_COMMENTS)
+        second = self.client.get(url, {"after": first["next"]}).json()
+        self.assertEqual(
+            len(second["comments"]), self.COUNT_COMMENTS - NUMBER_COMMENTS)
+        self.assertIsNone(second["next"])
+        self.assertEqual(second["comments"][0]["author"], self.user.username)
+
+        response = self.client.get(
+            url, {"after": first["next"], "format": "html"})
+        self.assertContains(response, "Комментарий 24")
+        self.assertNotContains(response, "js-more-comments")
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.post = Post.objects.create(text="Текст", author=cls.author)
+        counters.recount()
+        cls.detail_url = reverse(
+            "posts:post_detail", kwargs={"post_id": cls.post.pk})
+        cls.profile_url = reverse(
+            "posts:profile", kwargs={"username": cls.author.username})
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertNotModified(self, client, url, etag):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, client, url, etag):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_repeat_visit_is_one_query(self):
+        for url in (self.detail_url, self.profile_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn("Last-Modified", response)
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+
+    def test_edit_and_comment_change_post_detail(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = "Исправленный текст"
+        post.save()
+        self.assertModified(self.client, self.detail_url, etag)
+
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.reader_client.post(
+            reverse("posts:add_comment", kwargs={"post_id": self.post.pk}),
+            {"text": "Комментарий"},
+        )
+        self.assertModified(self.client, self.detail_url, etag)
+
+    def test_new_post_and_follow_change_profile(self):
+        etag = self.reader_client.get(self.profile_url)["ETag"]
+        self.assertNotModified(self.reader_client, self.profile_url, etag)
+        self.reader_client.get(
+            reverse("posts:profile_follow",
+                    kwargs={"username": self.author.username}))
+        self.assertModified(self.reader_client, self.profile_url, etag)
+
+        etag = self.client.get(self.profile_url)["ETag"]
+        Post.objects.create(text="Ещё пост", author=self.author)
+        self.assertModified(self.client, self.profile_url, etag)
+
+    def test_etag_depends_on_viewer(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.assertModified(self.reader_client, self.detail_url, etag)
+
+
+class FeedQueryCountTest(TestCase):
+    """Карточки с автором, группой, числом комментариев и миниатюрой
+    не делают запросов на каждый пост."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Название группы",
+            description="Описание",
+            slug="test-slug",
+        )
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(COUNT_PAGINATOR_POSTS):
+            # Миниатюр этих картинок нет ни в кеше, ни в базе.
+            post = Post.objects.create(
+                text=f"Текст {i}", author=cls.author, group=cls.group,
+                image=f"posts/missing-{i}.gif")
+            feed.fan_out(post)
+            comment = Comment.objects.create(
+                post=post, author=cls.reader, text="Комментарий")
+            counters.comment_added(comment)
+        counters.recount()
+        cls.urls = (
+            reverse("posts:index"),
+            reverse("posts:trending"),
+            reverse("posts:group_list", kwargs={"slug": cls.group.slug}),
+            reverse("posts:profile",
+                    kwargs={"username": cls.author.username}),
+            reverse("posts:follow_index"),
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def count_queries(self, url, page_size):
+        cache.clear()
+        with mock.patch("posts.views.NUMBER_POSTS", page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual(len(response.context["page_obj"]), page_size)
+        self.assertContains(response, "Комментариев: 1", count=page_size)
+        return len(queries)
+
+    def test_follow_feed_pages_count_from_counters(self):
+        """`?page=` ленты подписок не считает COUNT(*) по FeedItem."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("posts:follow_index"), {"page": 2})
+        self.assertEqual(len(response.context["page_obj"]),
+                         COUNT_PAGINATOR_POSTS - NUMBER_POSTS)
+        self.assertEqual(
+            response.context["page_obj"].paginator.num_pages, 2)
+        for captured in queries.captured_queries:
+            self.assertFalse(
+                "COUNT(" in captured["sql"]
+                and "posts_feeditem" in captured["sql"], captured["sql"])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.count_queries(url, 2), self.count_queries(url, 10))
+
+    def test_comment_refreshes_cached_cards(self):
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        self.assertContains(self.client.get(url), "Комментариев: 1")
+        post = Post.objects.latest("pub_date")
+        self.client.post(
+            reverse("posts:add_comment", kwargs={"post_id": post.pk}),
+            {"text": "Ещё комментарий"},
+        )
+        self.assertContains(self.client.get(url), "Комментариев: 2")
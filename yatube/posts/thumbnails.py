@@ -0,0 +1,127 @@
+"""Заранее создаваемые миниатюры картинок постов.
+
+Все размеры из `THUMBNAIL_PRESETS` создаются в фоне сразу после
+сохранения поста. Шаблоны только спрашивают, готова ли миниатюра, и пока
+её нет, показывают заглушку, а не ресайзят картинку во время запроса.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+
+from . import caching, images, tasks
+
+PENDING_TIMEOUT = 60 * 5
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl, умеющий проверить миниатюру, не создавая её."""
+
+    def _full_options(self, source, options):
+        # Те же умолчания, что и в ThumbnailBackend.get_thumbnail:
+        # от них зависит имя файла миниатюры.
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        with metrics.timer("yatube_thumbnail_seconds"):
+            super()._create_thumbnail(
+                source_image, geometry_string, options, thumbnail)
+
+    def ready_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, как его назовёт sorl; сам файл не проверяется."""
+        source = ImageFile(file_)
+        options = self._full_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None, если её ещё не создали."""
+        return default.kvstore.get(
+            self.ready_file(file_, geometry_string, **options))
+
+
+def generate(post_id):
+    """Пережимает слишком большой оригинал и создаёт все миниатюры поста.
+    Выполняется в фоновом процессе."""
+    from .models import Post
+
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    images.cap_original(post)
+    for geometry, options in settings.THUMBNAIL_PRESETS.values():
+        default.backend.get_thumbnail(post.image, geometry, **options)
+    cache.delete(_pending_key(post.image.name))
+    caching.bump(*caching.post_feeds(post))
+    # Процессы пула завершаются без atexit, поэтому сбрасываем сразу.
+    metrics.flush(force=True)
+
+
+def _pending_key(name):
+    return f"thumbnail-pending:{name}"
+
+
+def schedule(post):
+    """Ставит создание миниатюр в очередь после фиксации транзакции."""
+    if post.image and cache.add(
+            _pending_key(post.image.name), True, PENDING_TIMEOUT):
+        tasks.run_on_commit(generate, post.pk)
+
+
+def prefetch(images, preset):
+    """Поднимает в кеш записи sorl о миниатюрах всех картинок страницы.
+
+    Иначе на холодном кеше каждая карточка ищет свою миниатюру в базе
+    отдельным запросом. Найденное и ненайденное кешируется так же, как
+    это делает cached_db kvstore sorl.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    keys = [
+        add_prefix(default.backend.ready_file(image, geometry, **options).key)
+        for image in images if image
+    ]
+    cached = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in cached]
+    if not missing:
+        return
+    found = dict(KVStoreModel.objects.filter(
+        key__in=missing).values_list("key", "value"))
+    kvstore.cache.set_many(
+        {key: found.get(key, EMPTY_VALUE) for key in missing},
+        thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+    )
+
+
+def ready_thumbnail(image, preset):
+    """Готовая миниатюра `image` для размера `preset` или None.
+
+    Если миниатюры нет, её создание ставится в очередь.
+    """
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    thumbnail = default.backend.get_ready_thumbnail(image, geometry, **options)
+    if thumbnail is None:
+        schedule(image.instance)
+    return thumbnail
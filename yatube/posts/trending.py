@@ -0,0 +1,71 @@
+"""Популярные посты: оценка с экспоненциальным затуханием.
+
+Каждый комментарий прибавляет к `Post.trend_score` вес
+`1 + ln(1 + подписчики автора поста)`, умноженный на
+`2 ** ((время комментария - эпоха) / HALF_LIFE)`. Вместо того чтобы
+уменьшать все оценки с ходом времени, более новые события получают
+больший вес: порядок постов тот же, что и у оценок, затухающих вдвое
+за `HALF_LIFE`, а пересчитывать их по таблице комментариев не нужно.
+Лента читает посты по индексу `trend_score`.
+
+Веса растут со временем, поэтому команда `manage.py renormalize_trending`
+раз в сутки переносит эпоху на текущий момент и делит все оценки на
+одно и то же число. Без неё float переполнится примерно через год.
+"""
+import datetime
+import math
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Post, TrendEpoch
+
+ORDERING = ("-trend_score", "-id")
+HALF_LIFE = datetime.timedelta(hours=12)
+# Оценки меньше этой обнуляются при перенормировке.
+MIN_SCORE = 1e-6
+
+
+def epoch():
+    """Начало текущей эпохи."""
+    row, _ = TrendEpoch.objects.get_or_create(
+        pk=1, defaults={"started": timezone.now()})
+    return row.started
+
+
+def _growth(moment, start):
+    return 2 ** ((moment - start) / HALF_LIFE)
+
+
+def weight(followers):
+    """Вес комментария: чем больше у автора поста подписчиков, тем
+    больше людей увидят обсуждение."""
+    return 1 + math.log1p(followers or 0)
+
+
+def increment(comment, followers):
+    """На сколько комментарий поднимает оценку поста.
+
+    Вызывается в транзакции, которая уже записала комментарий: эпоха
+    читается под блокировкой записи и не может смениться до коммита.
+    """
+    return weight(followers) * _growth(comment.pub_date, epoch())
+
+
+def renormalize():
+    """Переносит эпоху на текущий момент и делит оценки на прирост веса
+    за прошедшую эпоху. Возвращает число изменённых постов."""
+    now = timezone.now()
+    with transaction.atomic():
+        started = epoch()
+        # Если эпоху успели сменить после чтения, SQLite не даст этой
+        # транзакции писать, а условие защищает и от прочих баз.
+        if not TrendEpoch.objects.filter(
+                pk=1, started=started).update(started=now):
+            raise RuntimeError("Эпоху одновременно перенормировали.")
+        factor = 1 / _growth(now, started)
+        scored = Post.objects.filter(trend_score__gt=0)
+        changed = scored.update(trend_score=F("trend_score") * factor)
+        scored.filter(trend_score__lt=MIN_SCORE).update(trend_score=0)
+    return changed
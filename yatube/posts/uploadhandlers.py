@@ -0,0 +1,96 @@
+"""Потоковая загрузка картинок с ранним отказом.
+
+Файл пишется на диск кусками, а размеры картинки читаются из первых
+килобайт заголовка. Слишком тяжёлые файлы и «бомбы декомпрессии»
+(маленький файл с огромным числом пикселей) отбрасываются до того, как
+их целиком прочитает и раскодирует проверка ImageField.
+"""
+import io
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+HEADER_BYTES = 64 * 1024
+
+
+class RejectedUpload(UploadedFile):
+    """Пустой файл вместо отклонённого; причина — в `upload_error`."""
+
+    def __init__(self, name, content_type, upload_error):
+        super().__init__(io.BytesIO(), name, content_type, 0)
+        self.upload_error = upload_error
+
+
+def image_size(header):
+    """Размеры картинки по началу файла или None, если данных мало.
+
+    Image.open читает только заголовок и ничего не раскодирует. Для
+    картинок больше предела Pillow поднимается DecompressionBombError.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            with Image.open(io.BytesIO(header)) as image:
+                return image.size
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = b""
+        self.header_checked = False
+        self.received = 0
+        self.upload_error = None
+
+    def reject(self, message):
+        self.upload_error = message
+        self.file.close()
+
+    def check_header(self):
+        try:
+            size = image_size(self.header)
+        except Image.DecompressionBombError:
+            self.header_checked = True
+            self.reject("Картинка слишком большая.")
+            return
+        if size is None:
+            # Не картинка или заголовок длиннее буфера: окончательное
+            # решение примет валидация формы.
+            self.header_checked = len(self.header) >= HEADER_BYTES
+            return
+        self.header_checked = True
+        width, height = size
+        if width * height > settings.MAX_IMAGE_PIXELS:
+            self.reject(
+                f"Картинка {width}×{height} слишком большая: не больше "
+                f"{settings.MAX_IMAGE_PIXELS:,} пикселей.".replace(",", " ")
+            )
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.upload_error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.MAX_IMAGE_UPLOAD_SIZE:
+            self.reject(
+                "Файл слишком большой: не больше "
+                f"{filesizeformat(settings.MAX_IMAGE_UPLOAD_SIZE)}."
+            )
+            return None
+        if not self.header_checked:
+            self.header += raw_data[:HEADER_BYTES - len(self.header)]
+            self.check_header()
+            if self.upload_error:
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.upload_error:
+            return RejectedUpload(
+                self.file_name, self.content_type, self.upload_error)
+        return super().file_complete(file_size)
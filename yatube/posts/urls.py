@@ -1,17 +1,46 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 
 app_name = 'posts'
 
+# Сколько SQL-запросов (с сессией и пользователем) может сделать
+# представление; см. core.middleware.QueryBudgetMiddleware.
+query_budgets = {
+    "index": 5,
+    "trending": 5,
+    "group_list": 5,
+    "profile": 8,
+    "post_detail": 7,
+    "post_create": 12,
+    "post_edit": 12,
+    "add_comment": 8,
+    "comments": 3,
+    "search": 4,
+    "api_index": 4,
+    "api_group_list": 4,
+    "api_profile": 4,
+    "export": 3,
+    "follow_index": 6,
+    "profile_follow": 12,
+    "profile_unfollow": 12,
+}
+
 urlpatterns = [
     path("", views.index, name="index"),
+    path("trending/", views.trending_posts, name="trending"),
     path("group/<slug:slug>/", views.group_posts, name="group_list"),
     path("profile/<str:username>/", views.profile, name="profile"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
     path("create/", views.post_create, name="post_create"),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path("posts/<int:post_id>/comment/", views.add_comment, name="add_comment"),
+    path("posts/<int:post_id>/comments/", views.post_comments, name="comments"),
+    path("search/", views.search, name="search"),
+    path("api/posts/", api.index, name="api_index"),
+    path("api/group/<slug:slug>/", api.group_posts, name="api_group_list"),
+    path("api/profile/<str:username>/", api.profile, name="api_profile"),
+    path("export/", views.export_data, name="export"),
     path("follow/", views.follow_index, name="follow_index"),
     path("profile/<str:username>/follow/", views.profile_follow, name="profile_follow"),
     path("profile/<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"),
@@ -1,40 +1,90 @@
+import hashlib
+
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
-from .models import Post, Group, User, Follow
+from core import routers
+from core.sqlite import retry_on_locked
+from .models import Comment, Post, Group, User, Follow
 from .forms import PostForm, CommentForm
+from .paginator import DEFAULT_ORDERING, CountedPaginator, CursorPaginator
+from .search import SearchPaginator, make_query
+from . import (
+    caching, counters, export, feed, follow_graph, recommendations,
+    thumbnails, trending,
+)
 
 NUMBER_POSTS = 10
+NUMBER_COMMENTS = 20
+COMMENTS_ORDERING = ("pub_date", "id")
+
 
+def make_page_obj(request, queryset, ordering=DEFAULT_ORDERING, count=None,
+                  feed=None):
+    """Страница ленты: по курсорам `?after=`/`?before=`,
+    а для старых ссылок `?page=` — обычная постраничная навигация.
 
-def make_page_obj(request, queryset):
-    paginator = Paginator(queryset, NUMBER_POSTS)
+    `count` — известное из счётчиков число постов, чтобы не делать COUNT(*).
+    Без него число берётся из кеша ленты `feed`, если она указана.
+    """
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    queryset = queryset.order_by(*ordering)
+    if page_number is not None:
+        if count is None and feed is not None:
+            count = caching.count(feed, queryset)
+        if count is None:
+            paginator = Paginator(queryset, NUMBER_POSTS)
+        else:
+            paginator = CountedPaginator(queryset, NUMBER_POSTS, count)
+        page_obj = paginator.get_page(page_number)
+    else:
+        paginator = CursorPaginator(queryset, NUMBER_POSTS, ordering)
+        page_obj = paginator.get_cursor_page(
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
     return {
         "page_obj": page_obj
     }
 
 
 def index(request):
-    post_list = Post.objects.select_related("author")
-    context = make_page_obj(request, post_list)
+    post_list = Post.objects.select_related("author", "group")
+    context = make_page_obj(request, post_list, feed="index")
+    context.update(caching.fragment_context(request, "index"))
     template = "posts/index.html"
     return render(request, template, context)
 
 
+def trending_posts(request):
+    """Посты, которые сейчас активно обсуждают."""
+    post_list = Post.objects.select_related("author", "group")
+    # Постов столько же, сколько на главной, поэтому и COUNT(*) общий.
+    context = make_page_obj(request, post_list, trending.ORDERING,
+                            feed="index")
+    return render(request, "posts/trending.html", context)
+
+
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related("author")
-    context = make_page_obj(request, post_list)
+    post_list = group.posts.select_related("author", "group")
+    context = make_page_obj(request, post_list, count=group.posts_count)
+    context.update(caching.fragment_context(request, f"group:{group.pk}"))
     context["group"] = group
     template = "posts/group_list.html"
     return render(request, template, context)
 
 
 @login_required()
+@retry_on_locked
 def post_create(request):
     template = "posts/create_post.html"
     form = PostForm(
@@ -44,95 +94,283 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+            counters.post_added(post)
+            feed.fan_out(post)
+            thumbnails.schedule(post)
         return redirect("posts:profile", request.user)
     return render(request, template, {"form": form})
 
 
 @login_required()
+@retry_on_locked
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if post.author != request.user:
         return redirect("posts:post_detail", post_id)
     template = "posts/create_post.html"
+    old_group_id = post.group_id
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
         instance=post,
     )
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
+            counters.post_moved(post, old_group_id)
+            if "image" in form.changed_data:
+                thumbnails.schedule(post)
         return redirect("posts:post_detail", post_id)
     else:
         return render(request, template, {"form": form})
 
 
+def _validator(request, queryset, **fields):
+    """Данные для ETag и Last-Modified одним запросом по индексам.
+
+    Результат запоминается на время запроса: его читают обе функции
+    декоратора `condition`.
+    """
+    if not hasattr(request, "_validator"):
+        request._validator = queryset.values(**fields).first()
+    return request._validator
+
+
+def _etag(request, values):
+    if values is None:
+        return None
+    version = "|".join(map(str, (
+        request.user.pk,
+        caching.page_key(request),
+        *values.values(),
+    )))
+    return hashlib.md5(version.encode()).hexdigest()
+
+
+def profile_validator(request, username):
+    values = _validator(
+        request,
+        User.objects.filter(username=username),
+        author_pk=F("pk"),
+        posts_count=F("stats__posts_count"),
+        followers_count=F("stats__followers_count"),
+        following_count=F("stats__following_count"),
+        last_edit=Subquery(
+            Post.objects.filter(author=OuterRef("pk")).order_by(
+                "-updated_at").values("updated_at")[:1]
+        ),
+    )
+    if values is not None and "is_following" not in values:
+        values["is_following"] = follow_graph.is_following(
+            request.user.pk, values["author_pk"])
+        # Меняется и от новых комментариев: их число есть в карточках.
+        values["feed"] = caching.generation(f"profile:{values['author_pk']}")
+        if request.user.is_authenticated:
+            values["recommended"] = caching.generation(recommendations.FEED)
+            # Из блока рекомендаций пропадают авторы, на которых читатель
+            # подписался, в том числе с чужих страниц.
+            values["following"] = follow_graph.fingerprint(request.user.pk)
+    return values
+
+
+def profile_etag(request, username):
+    return _etag(request, profile_validator(request, username))
+
+
+def profile_last_modified(request, username):
+    values = profile_validator(request, username)
+    return values and values["last_edit"]
+
+
+@condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username)
     user = request.user
-    post_list = author.posts.select_related("author")
-    context = make_page_obj(request, post_list)
-    if user.is_authenticated:
-        following: bool = Follow.objects.filter(user=user, author=author).exists()
-    else:
-        following = False
+    stats = counters.stats_for(author)
+    post_list = author.posts.select_related("author", "group")
+    context = make_page_obj(request, post_list, count=stats.posts_count)
+    following = follow_graph.is_following(user.pk, author.pk)
+    context.update(caching.fragment_context(request, f"profile:{author.pk}"))
     context["author"] = author
+    context["stats"] = stats
     context["following"] = following
+    context["recommendations"] = recommendations.for_user(user)
     template = 'posts/profile.html'
     return render(request, template, context)
 
 
+def post_detail_validator(request, post_id):
+    return _validator(
+        request,
+        Post.objects.filter(pk=post_id),
+        last_edit=F("updated_at"),
+        comment_count=F("comments_count"),
+        author_posts=F("author__stats__posts_count"),
+        last_comment=Subquery(
+            Comment.objects.filter(post=OuterRef("pk")).order_by(
+                "-pub_date").values("pub_date")[:1]
+        ),
+    )
+
+
+def post_detail_etag(request, post_id):
+    return _etag(request, post_detail_validator(request, post_id))
+
+
+def post_detail_last_modified(request, post_id):
+    values = post_detail_validator(request, post_id)
+    if values is None:
+        return None
+    return max(filter(None, (values["last_edit"], values["last_comment"])))
+
+
+@condition(etag_func=post_detail_etag,
+           last_modified_func=post_detail_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    num_pages = post.author.posts.count()
-    comments = post.comments.select_related("post")
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), pk=post_id)
+    num_pages = counters.stats_for(post.author).posts_count
+    comments = make_comments_page(request, post)
     context = {
         "post": post,
         "num_pages": num_pages,
         "comments": comments,
         "form": CommentForm(),
     }
+    context.update(caching.fragment_context(request, f"post:{post.pk}"))
     template = 'posts/post_detail.html'
     return render(request, template, context)
 
 
+def make_comments_page(request, post):
+    paginator = CursorPaginator(
+        post.comments.select_related("author"),
+        NUMBER_COMMENTS,
+        COMMENTS_ORDERING,
+    )
+    return paginator.get_cursor_page(after=request.GET.get("after"))
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев: JSON или HTML-фрагмент."""
+    post = get_object_or_404(Post.objects.only("id"), pk=post_id)
+    comments = make_comments_page(request, post)
+    if request.GET.get("format") == "html":
+        html = render_to_string(
+            "includes/comments.html",
+            {"post": post, "comments": comments},
+            request=request,
+        )
+        return HttpResponse(html)
+    return JsonResponse(
+        {
+            "comments": [
+                {
+                    "id": comment.id,
+                    "author": comment.author.username,
+                    "text": comment.text,
+                    "pub_date": comment.pub_date,
+                }
+                for comment in comments
+            ],
+            "next": comments.next_cursor,
+        },
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
 @login_required
+@retry_on_locked
 def add_comment(request, post_id):
-    post = Post.objects.get(id=post_id)
+    post = Post.objects.select_related("author__stats").get(id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        followers = counters.stats_for(post.author).followers_count
+        with transaction.atomic():
+            comment.save()
+            counters.comment_added(
+                comment, trending.increment(comment, followers))
     return redirect("posts:post_detail", post_id=post_id)
 
 
+def search(request):
+    """Поиск по тексту постов, от самых релевантных."""
+    q = request.GET.get("q", "").strip()
+    query = make_query(q)
+    page_obj = None
+    if query:
+        paginator = SearchPaginator(query, NUMBER_POSTS)
+        page_obj = paginator.get_cursor_page(
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
+    context = {
+        "q": q,
+        "page_obj": page_obj,
+        "page_query": urlencode({"q": q}) + "&",
+    }
+    return render(request, "posts/search.html", context)
+
+
+@login_required
+def export_data(request):
+    """Выгрузка своих постов, комментариев и подписок (ndjson или zip)."""
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in export.FORMATS:
+        fmt = "ndjson"
+    stream, content_type, extension = export.FORMATS[fmt]
+    response = StreamingHttpResponse(
+        stream(request.user), content_type=content_type)
+    response["Content-Disposition"] = (
+        f'attachment; filename="{request.user.username}.{extension}"')
+    return response
+
+
 @login_required
 def follow_index(request):
-    user = request.user
-    follows = user.follower.all()
-    auhtors_id = [follow.author.id for follow in follows]
-    posts = Post.objects.filter(author_id__in=auhtors_id)
-    context = make_page_obj(request, posts)
+    posts = feed.follow_feed(request.user)
+    count = None
+    if "page" in request.GET:
+        count = counters.follow_feed_count(request.user)
+    context = make_page_obj(request, posts, feed.FEED_ORDERING, count=count)
+    context["recommendations"] = recommendations.for_user(request.user)
     return render(request, "posts/follow.html", context=context)
 
 
 @login_required
+@routers.primary()
+@retry_on_locked
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(user=user, author=author).exists()
-    user_is_not_author = user == author
-    if (not follow) and (not user_is_not_author):
-        Follow.objects.create(user=user, author=author)
+    if user != author:
+        # Граф подписок в кеше может отставать, поэтому о повторной
+        # подписке сообщает ограничение unique_follow, а не кеш.
+        try:
+            with transaction.atomic():
+                follow = Follow.objects.create(user=user, author=author)
+                counters.follow_added(follow)
+                feed.backfill(user, author)
+        except IntegrityError:
+            pass
     return redirect("posts:profile", username=username)
 
 
 @login_required
+@routers.primary()
+@retry_on_locked
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
     follow = get_object_or_404(Follow, author=author, user=user)
-    follow.delete()
+    with transaction.atomic():
+        follow.delete()
+        counters.follow_removed(follow)
+        feed.drop(user, author)
     return redirect("posts:profile", username=username)
@@ -15,12 +15,44 @@ import os
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Общий для всех воркеров кеш в файле SQLite (core/cache.py).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Миниатюры картинок постов создаются заранее, в фоне (posts/thumbnails.py).
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+
+THUMBNAIL_PRESETS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# Загрузка картинок: файл пишется на диск потоком, а слишком большие
+# или «раздутые» картинки отбрасываются по заголовку (posts/uploadhandlers.py).
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploadhandlers.BoundedImageUploadHandler',
+]
+
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+
+MAX_IMAGE_PIXELS = 40_000_000
+
+# Оригиналы крупнее этого размера по большей стороне пережимаются в фоне.
+MAX_IMAGE_SIDE = 2560
+
+# Процессы для фоновых задач (posts/tasks.py); 0 — выполнять сразу.
+BACKGROUND_WORKERS = 2
+
+# Время жизни фрагментов лент. Устаревание обеспечивают поколения лент
+# (posts/caching.py), поэтому срок может быть большим.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
@@ -66,21 +98,43 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
+
+# Превышение бюджета SQL-запросов представления: в логе или ошибкой.
+# Тестовый раннер включает строгий режим сам.
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Метрики процессов для /metrics: каталог с файлами и период их записи.
+METRICS_DIR = os.path.join(BASE_DIR, 'cache', 'metrics')
+METRICS_FLUSH_INTERVAL = 1
+# Кроме сотрудников, /metrics доступна только с этих адресов (Prometheus),
+# через запятую в YATUBE_METRICS_IPS.
+METRICS_ALLOWED_IPS = os.environ.get(
+    'YATUBE_METRICS_IPS', '127.0.0.1,::1').split(',')
+
+# Профили запросов по ?_profile=1 или заголовку X-Profile (core.profiling).
+PROFILING_DIR = os.path.join(BASE_DIR, 'cache', 'profiles')
+PROFILING_KEEP = 50
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -104,10 +158,37 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get(
+            'YATUBE_DB', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 60)),
     }
 }
 
+# Выполняются при открытии каждого соединения SQLite (core.sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, здесь 64 МиБ.
+    'cache_size': -64 * 1024,
+}
+
+# Реплики только для чтения, через запятую в YATUBE_REPLICA_DBS.
+# Локально это копии основной базы, их обновляет `manage.py sync_replicas`.
+_replica_paths = os.environ.get('YATUBE_REPLICA_DBS', '')
+for _number, _path in enumerate(filter(None, _replica_paths.split(',')), 1):
+    DATABASES[f'replica{_number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _path,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает только из основной базы.
+REPLICA_STICKY_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -3,6 +3,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import views as core_views
+
 handler404 = "core.views.page_not_found"
 
 urlpatterns = [
@@ -11,6 +13,12 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', core_views.prometheus_metrics, name='metrics'),
+    path('profiles/', core_views.profiles, name='profiles'),
+    path('profiles/<str:name>/', core_views.profile_detail,
+         name='profile_detail'),
+    path('profiles/<str:name>/download/', core_views.profile_download,
+         name='profile_download'),
 ]
 if settings.DEBUG:
     urlpatterns += static(